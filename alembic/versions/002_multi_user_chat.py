@@ -18,6 +18,44 @@ branch_labels = None
 depends_on = None
 
 
+BACKFILL_BATCH_SIZE = 1000
+
+INDEXES = [
+    ("idx_chat_participants_session_id", "chat_participants", ["session_id"]),
+    ("idx_chat_participants_user_id", "chat_participants", ["user_id"]),
+    ("idx_chat_participants_active", "chat_participants", ["is_active"]),
+    ("idx_chat_sessions_type", "chat_sessions", ["session_type"]),
+    ("idx_chat_messages_user_id", "chat_messages", ["user_id"]),
+]
+
+
+def _backfill_in_batches(table_name, assignments, pending_condition):
+    """Run an UPDATE over id ranges so each batch commits on its own.
+
+    Must be called inside an autocommit block; in offline (--sql) mode the
+    table cannot be inspected, so a single UPDATE is emitted instead.
+    """
+    if op.get_context().as_sql:
+        op.execute(
+            f"UPDATE {table_name} SET {assignments} WHERE {pending_condition}"
+        )
+        return
+
+    connection = op.get_bind()
+    min_id, max_id = connection.execute(
+        sa.text(f"SELECT MIN(id), MAX(id) FROM {table_name}")
+    ).one()
+    if min_id is None:
+        return
+
+    statement = sa.text(
+        f"UPDATE {table_name} SET {assignments} "
+        f"WHERE ({pending_condition}) AND id BETWEEN :lo AND :hi"
+    )
+    for lo in range(min_id, max_id + 1, BACKFILL_BATCH_SIZE):
+        connection.execute(statement, {"lo": lo, "hi": lo + BACKFILL_BATCH_SIZE - 1})
+
+
 def upgrade():
     # Create enum types with checkfirst
     session_type_enum = postgresql.ENUM(
@@ -30,19 +68,28 @@ def upgrade():
     )
     participant_role_enum.create(op.get_bind(), checkfirst=True)
 
-    # Add new columns to chat_sessions
+    # Add new columns to chat_sessions as nullable so the ALTER is metadata-only,
+    # then backfill in batches before tightening them to NOT NULL
     op.add_column("chat_sessions", sa.Column("description", sa.Text(), nullable=True))
     op.add_column(
-        "chat_sessions",
-        sa.Column(
-            "session_type", session_type_enum, nullable=False, server_default="PRIVATE"
-        ),
+        "chat_sessions", sa.Column("session_type", session_type_enum, nullable=True)
     )
     op.add_column(
-        "chat_sessions",
-        sa.Column(
-            "max_participants", sa.Integer(), nullable=False, server_default="10"
-        ),
+        "chat_sessions", sa.Column("max_participants", sa.Integer(), nullable=True)
+    )
+
+    with op.get_context().autocommit_block():
+        _backfill_in_batches(
+            "chat_sessions",
+            "session_type = 'PRIVATE', max_participants = 10",
+            "session_type IS NULL OR max_participants IS NULL",
+        )
+
+    op.alter_column(
+        "chat_sessions", "session_type", nullable=False, server_default="PRIVATE"
+    )
+    op.alter_column(
+        "chat_sessions", "max_participants", nullable=False, server_default="10"
     )
 
     # Add user_id to chat_messages
@@ -69,23 +116,22 @@ def upgrade():
         sa.UniqueConstraint("session_id", "user_id", name="unique_session_user"),
     )
 
-    # Create indexes for better performance
-    op.create_index(
-        "idx_chat_participants_session_id", "chat_participants", ["session_id"]
-    )
-    op.create_index("idx_chat_participants_user_id", "chat_participants", ["user_id"])
-    op.create_index("idx_chat_participants_active", "chat_participants", ["is_active"])
-    op.create_index("idx_chat_sessions_type", "chat_sessions", ["session_type"])
-    op.create_index("idx_chat_messages_user_id", "chat_messages", ["user_id"])
+    # Create indexes for better performance. CONCURRENTLY cannot run inside a
+    # transaction, and avoids blocking writes on the existing tables.
+    with op.get_context().autocommit_block():
+        for index_name, table_name, columns in INDEXES:
+            op.create_index(
+                index_name, table_name, columns, postgresql_concurrently=True
+            )
 
 
 def downgrade():
     # Drop indexes
-    op.drop_index("idx_chat_messages_user_id")
-    op.drop_index("idx_chat_sessions_type")
-    op.drop_index("idx_chat_participants_active")
-    op.drop_index("idx_chat_participants_user_id")
-    op.drop_index("idx_chat_participants_session_id")
+    with op.get_context().autocommit_block():
+        for index_name, table_name, _ in reversed(INDEXES):
+            op.drop_index(
+                index_name, table_name=table_name, postgresql_concurrently=True
+            )
 
     # Drop chat_participants table
     op.drop_table("chat_participants")
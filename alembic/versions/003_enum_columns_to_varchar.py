@@ -0,0 +1,94 @@
+"""Store enum columns as VARCHAR instead of native Postgres ENUM types
+
+Revision ID: 003
+Revises: 002
+Create Date: 2024-08-20 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+# (table, column, enum type name, allowed values, server default)
+ENUM_COLUMNS = [
+    ("chat_messages", "role", "messagerole", ("USER", "ASSISTANT", "SYSTEM"), None),
+    (
+        "chat_sessions",
+        "session_type",
+        "sessiontype",
+        ("PRIVATE", "PUBLIC", "INVITE_ONLY"),
+        "PRIVATE",
+    ),
+    (
+        "chat_participants",
+        "role",
+        "participantrole",
+        ("OWNER", "ADMIN", "MEMBER", "VIEWER"),
+        "MEMBER",
+    ),
+]
+
+
+def _check_name(table, column):
+    return f"ck_{table}_{column}"
+
+
+def _check_condition(column, values):
+    allowed = ", ".join(f"'{value}'" for value in values)
+    return f"{column} IN ({allowed})"
+
+
+def upgrade():
+    for table, column, type_name, values, default in ENUM_COLUMNS:
+        # The enum-typed default has to go before the column type can change
+        if default is not None:
+            op.alter_column(table, column, server_default=None)
+
+        op.alter_column(
+            table,
+            column,
+            type_=sa.String(20),
+            existing_nullable=False,
+            postgresql_using=f"{column}::text",
+        )
+
+        if default is not None:
+            op.alter_column(table, column, server_default=default)
+
+        # Keep database-side validation now that the type no longer enforces it
+        op.create_check_constraint(
+            _check_name(table, column), table, _check_condition(column, values)
+        )
+
+        op.execute(f"DROP TYPE IF EXISTS {type_name}")
+
+
+def downgrade():
+    for table, column, type_name, values, default in ENUM_COLUMNS:
+        enum_type = postgresql.ENUM(*values, name=type_name, create_type=False)
+        enum_type.create(op.get_bind(), checkfirst=True)
+
+        op.drop_constraint(_check_name(table, column), table, type_="check")
+
+        if default is not None:
+            op.alter_column(table, column, server_default=None)
+
+        op.alter_column(
+            table,
+            column,
+            type_=enum_type,
+            existing_nullable=False,
+            postgresql_using=f"{column}::{type_name}",
+        )
+
+        if default is not None:
+            op.alter_column(table, column, server_default=default)
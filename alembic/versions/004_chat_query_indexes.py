@@ -0,0 +1,99 @@
+"""Replace single-column participant indexes with partial indexes
+
+Revision ID: 004
+Revises: 003
+Create Date: 2024-08-21 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # Almost every participant lookup filters on is_active as well, so
+        # partial indexes over the active rows replace the single-column ones
+        # (the boolean is_active index was too unselective to be used).
+        op.create_index(
+            "idx_participants_session_active",
+            "chat_participants",
+            ["session_id"],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_participants_user_active",
+            "chat_participants",
+            ["user_id"],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_chat_participants_active",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_chat_participants_session_id",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_chat_participants_user_id",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+
+        # Serves message history pagination for a session, newest first
+        op.create_index(
+            "idx_chat_messages_session_created",
+            "chat_messages",
+            ["session_id", sa.text("created_at DESC")],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_chat_messages_session_created",
+            table_name="chat_messages",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_chat_participants_session_id",
+            "chat_participants",
+            ["session_id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_chat_participants_user_id",
+            "chat_participants",
+            ["user_id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_chat_participants_active",
+            "chat_participants",
+            ["is_active"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_participants_user_active",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_participants_session_active",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
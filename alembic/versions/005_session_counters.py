@@ -0,0 +1,70 @@
+"""Add denormalized participant and message counters to chat sessions
+
+Revision ID: 005
+Revises: 004
+Create Date: 2024-08-22 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.migrations import paginated_backfill
+
+
+# revision identifiers, used by Alembic.
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+
+chat_sessions = sa.table("chat_sessions", sa.column("id", sa.Integer))
+
+BACKFILL_SQL = sa.text(
+    """
+    UPDATE chat_sessions SET
+        participant_count = (
+            SELECT COUNT(*) FROM chat_participants
+            WHERE chat_participants.session_id = chat_sessions.id
+            AND chat_participants.is_active
+        ),
+        message_count = (
+            SELECT COUNT(*) FROM chat_messages
+            WHERE chat_messages.session_id = chat_sessions.id
+        )
+    """
+)
+
+
+def _backfill_page(connection, rows):
+    connection.execute(
+        sa.text(f"{BACKFILL_SQL.text} WHERE chat_sessions.id BETWEEN :lo AND :hi"),
+        {"lo": rows[0].id, "hi": rows[-1].id},
+    )
+
+
+def upgrade():
+    # A constant server default makes the ADD COLUMN a metadata-only change
+    op.add_column(
+        "chat_sessions",
+        sa.Column(
+            "participant_count", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column(
+        "chat_sessions",
+        sa.Column("message_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    if op.get_context().as_sql:
+        op.execute(BACKFILL_SQL)
+    else:
+        paginated_backfill(
+            sa.select(chat_sessions.c.id), chat_sessions.c.id, _backfill_page
+        )
+
+
+def downgrade():
+    op.drop_column("chat_sessions", "message_count")
+    op.drop_column("chat_sessions", "participant_count")
@@ -0,0 +1,50 @@
+"""Index messages on (session_id, created_at, id) for keyset pagination
+
+Revision ID: 007
+Revises: 006
+Create Date: 2024-08-24 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "007"
+down_revision = "006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        # Message pages seek and sort on (created_at, id) within a session; with
+        # id in the key the tiebreak is read from the index instead of sorted.
+        # A backward scan serves the newest-first order.
+        op.create_index(
+            "idx_chat_messages_session_created_id",
+            "chat_messages",
+            ["session_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_chat_messages_session_created",
+            table_name="chat_messages",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_chat_messages_session_created",
+            "chat_messages",
+            ["session_id", sa.text("created_at DESC")],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_chat_messages_session_created_id",
+            table_name="chat_messages",
+            postgresql_concurrently=True,
+        )
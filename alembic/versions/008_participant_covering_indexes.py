@@ -0,0 +1,67 @@
+"""Cover participant membership and user-session lookups with their indexes
+
+Revision ID: 008
+Revises: 007
+Create Date: 2024-08-25 00:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        # A user's session list joins on session_id from the active rows; with
+        # it in the key the join is answered by an index-only scan.
+        op.create_index(
+            "idx_participants_user_session_active",
+            "chat_participants",
+            ["user_id", "session_id"],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_participants_user_active",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+
+        # Membership and permission checks filter (session_id, user_id) and
+        # read is_active and role; carrying both skips the heap fetch.
+        op.create_index(
+            "idx_participants_session_user_cover",
+            "chat_participants",
+            ["session_id", "user_id"],
+            postgresql_include=["is_active", "role"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_participants_session_user_cover",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "idx_participants_user_active",
+            "chat_participants",
+            ["user_id"],
+            postgresql_where=sa.text("is_active"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "idx_participants_user_session_active",
+            table_name="chat_participants",
+            postgresql_concurrently=True,
+        )
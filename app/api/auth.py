@@ -1,9 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import create_access_token, create_refresh_token, verify_token
+from fastapi.concurrency import run_in_threadpool
+from app.core.security import (
+    create_access_token,
+    create_refresh_token,
+    verify_token,
+    get_password_hash_async,
+    verify_password_async,
+)
+from app.api.dependencies import get_refresh_state
 from app.schemas.user import UserCreate, UserResponse, UserLogin, Token
-from app.services.user_service import UserService
+from app.services.user_service import UserService, get_user_service
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -11,42 +17,54 @@ router = APIRouter(prefix="/auth", tags=["authentication"])
 @router.post(
     "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED
 )
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(
+    user_data: UserCreate, user_service: UserService = Depends(get_user_service)
+):
     """Register a new user."""
-    user_service = UserService(db)
 
-    # Check if email already exists
-    if user_service.is_email_taken(user_data.email):
+    # Check email and username availability in a single query
+    conflicts = await run_in_threadpool(
+        user_service.find_registration_conflicts, user_data.email, user_data.username
+    )
+    if "email" in conflicts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
-
-    # Check if username already exists
-    if user_service.is_username_taken(user_data.username):
+    if "username" in conflicts:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
         )
 
     try:
-        user = user_service.create_user(user_data)
-        return user
+        # Hash on the dedicated pool, then write through the regular threadpool
+        hashed_password = await get_password_hash_async(user_data.password)
+        user = await run_in_threadpool(
+            user_service.create_user, user_data, hashed_password
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not create user",
         )
 
+    await user_service.add_to_bloom(user.email, user.username)
+    return user
+
 
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(
+    user_credentials: UserLogin,
+    user_service: UserService = Depends(get_user_service),
+):
     """Authenticate user and return tokens."""
-    user_service = UserService(db)
 
-    # Authenticate user
-    user = user_service.authenticate_user(
-        user_credentials.email, user_credentials.password
+    # Authenticate user, verifying the password on the dedicated hashing pool
+    user = await run_in_threadpool(
+        user_service.get_user_by_email, user_credentials.email
     )
-    if not user:
+    if not user or not await verify_password_async(
+        user_credentials.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -60,7 +78,9 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
 
     # Create access token
     access_token = create_access_token(data={"user_id": user.id, "email": user.email})
-    refresh_token = create_refresh_token(data={"user_id": user.id, "email": user.email})
+    refresh_token = create_refresh_token(
+        data={"user_id": user.id, "email": user.email, "v": user.token_version}
+    )
 
     return {
         "access_token": access_token,
@@ -70,7 +90,9 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+def refresh_token(
+    refresh_token: str, user_service: UserService = Depends(get_user_service)
+):
     """Refresh access token using refresh token."""
     payload = verify_token(refresh_token)
 
@@ -87,18 +109,23 @@ def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
 
-    user_service = UserService(db)
-    user = user_service.get_user_by_id(user_id)
-
-    if not user or not user.is_active:
+    # Served from a short-lived per-user cache; tokens issued before the
+    # user's token_version was bumped are rejected
+    state = get_refresh_state(user_service, user_id)
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user"
+        )
+    email, is_active, token_version = state
+    if not is_active or payload.get("v", 0) != token_version:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid user"
         )
 
     # Create new tokens
-    access_token = create_access_token(data={"user_id": user.id, "email": user.email})
+    access_token = create_access_token(data={"user_id": user_id, "email": email})
     new_refresh_token = create_refresh_token(
-        data={"user_id": user.id, "email": user.email}
+        data={"user_id": user_id, "email": email, "v": token_version}
     )
 
     return {
@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from typing import List, Optional, Tuple
+from datetime import datetime
+import base64
+import orjson
 from app.api.dependencies import get_current_active_user
 from app.schemas.chat import (
     ChatSessionCreate,
+    ChatSessionBulkCreate,
     ChatSessionUpdate,
     ChatSessionResponse,
     ChatSessionListResponse,
     ChatMessageCreate,
+    ChatMessageBulkCreate,
     ChatMessageResponse,
     ChatParticipantResponse,
     JoinSessionRequest,
@@ -16,12 +19,34 @@ from app.schemas.chat import (
     UpdateParticipantRoleRequest,
     PublicSessionsResponse,
 )
-from app.services.chat_service import ChatService
+from app.services.chat_service import ChatService, get_chat_service
 from app.models.user import User
 from app.models.chat_participant import ParticipantRole
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Number of recent messages embedded in a session detail response
+SESSION_DETAIL_MESSAGE_LIMIT = 50
+
+CURSOR_DESCRIPTION = "Opaque X-Next-Cursor value of the previous page"
+
+
+def _encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Pack a (timestamp, id) keyset position into an opaque cursor."""
+    payload = orjson.dumps([timestamp.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Unpack a cursor made by _encode_cursor."""
+    try:
+        timestamp, row_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
 
 @router.post(
     "/sessions", response_model=ChatSessionResponse, status_code=status.HTTP_201_CREATED
@@ -29,10 +54,9 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 def create_chat_session(
     session_data: ChatSessionCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Create a new chat session."""
-    chat_service = ChatService(db)
     session = chat_service.create_session(current_user.id, session_data)
 
     # Get the session with all details to return
@@ -46,24 +70,76 @@ def create_chat_session(
         )
 
     # Format the response
-    return _format_session_response(detailed_session)
+    return _format_session_response(chat_service, detailed_session)
+
+
+@router.post(
+    "/sessions/bulk",
+    response_model=List[ChatSessionListResponse],
+    status_code=status.HTTP_201_CREATED,
+)
+def create_chat_sessions(
+    bulk_data: ChatSessionBulkCreate,
+    current_user: User = Depends(get_current_active_user),
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """Create several chat sessions in one request and transaction."""
+    sessions = chat_service.create_sessions(current_user.id, bulk_data.sessions)
+
+    # New sessions have no messages and only their owner as participant
+    return [
+        ChatSessionListResponse.model_construct(
+            id=session.id,
+            title=session.title,
+            description=session.description,
+            session_type=session.session_type,
+            owner_username=current_user.username,
+            created_at=session.created_at,
+            updated_at=session.updated_at,
+            message_count=session.message_count,
+            participant_count=session.participant_count,
+        )
+        for session in sessions
+    ]
 
 
 @router.get("/sessions", response_model=List[ChatSessionListResponse])
 def get_chat_sessions(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
-    """Get all chat sessions where the current user is a participant."""
-    chat_service = ChatService(db)
-    sessions_with_counts = chat_service.get_user_sessions_with_counts(
-        current_user.id, skip=skip, limit=limit
+    """Get all chat sessions where the current user is a participant.
+
+    Pass the X-Next-Cursor header of one response as cursor to get the next
+    page; it seeks instead of scanning skipped rows. skip cannot be combined
+    with a cursor and is rejected with 400.
+    """
+    before_updated_at = before_id = None
+    if cursor:
+        if skip:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="skip cannot be combined with cursor",
+            )
+        before_updated_at, before_id = _decode_cursor(cursor)
+
+    sessions = chat_service.get_user_sessions_with_counts(
+        current_user.id,
+        skip=skip,
+        limit=limit,
+        before_updated_at=before_updated_at,
+        before_id=before_id,
     )
+    if len(sessions) == limit:
+        last = sessions[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(last.updated_at, last.id)
 
     result = []
-    for session, message_count, participant_count in sessions_with_counts:
+    for session in sessions:
         result.append(
             ChatSessionListResponse(
                 id=session.id,
@@ -73,8 +149,8 @@ def get_chat_sessions(
                 owner_username=session.owner.username if session.owner else None,
                 created_at=session.created_at,
                 updated_at=session.updated_at,
-                message_count=message_count or 0,
-                participant_count=participant_count or 0,
+                message_count=session.message_count,
+                participant_count=session.participant_count,
             )
         )
 
@@ -86,28 +162,15 @@ def get_public_sessions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Get public chat sessions that the user can join."""
-    chat_service = ChatService(db)
     sessions, total = chat_service.get_public_sessions(
         current_user.id, skip=skip, limit=limit
     )
 
     formatted_sessions = []
     for session in sessions:
-        # Get participant count for each session
-        from app.models.chat_participant import ChatParticipant
-
-        participant_count = (
-            db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session.id,
-                ChatParticipant.is_active == True,
-            )
-            .count()
-        )
-
         formatted_sessions.append(
             ChatSessionListResponse(
                 id=session.id,
@@ -118,7 +181,7 @@ def get_public_sessions(
                 created_at=session.created_at,
                 updated_at=session.updated_at,
                 message_count=0,  # We don't need message count for public sessions list
-                participant_count=participant_count,
+                participant_count=session.participant_count,
             )
         )
 
@@ -129,10 +192,9 @@ def get_public_sessions(
 def get_chat_session(
     session_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Get a specific chat session with messages and participants."""
-    chat_service = ChatService(db)
     session = chat_service.get_session_with_details(session_id, current_user.id)
 
     if not session:
@@ -140,7 +202,7 @@ def get_chat_session(
             status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found"
         )
 
-    return _format_session_response(session)
+    return _format_session_response(chat_service, session)
 
 
 @router.put("/sessions/{session_id}", response_model=ChatSessionResponse)
@@ -148,13 +210,12 @@ def update_chat_session(
     session_id: int,
     session_update: ChatSessionUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Update a chat session (owner/admin only)."""
-    chat_service = ChatService(db)
-    session = chat_service.update_session(session_id, current_user.id, session_update)
+    updated = chat_service.update_session(session_id, current_user.id, session_update)
 
-    if not session:
+    if not updated:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat session not found or insufficient permissions",
@@ -164,17 +225,16 @@ def update_chat_session(
     detailed_session = chat_service.get_session_with_details(
         session_id, current_user.id
     )
-    return _format_session_response(detailed_session)
+    return _format_session_response(chat_service, detailed_session)
 
 
 @router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_chat_session(
     session_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Delete a chat session (owner only)."""
-    chat_service = ChatService(db)
     success = chat_service.delete_session(session_id, current_user.id)
 
     if not success:
@@ -191,10 +251,9 @@ def join_chat_session(
     session_id: int,
     join_data: JoinSessionRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Join a public chat session."""
-    chat_service = ChatService(db)
     participant = chat_service.join_session(session_id, current_user.id)
 
     if not participant:
@@ -213,10 +272,9 @@ def join_chat_session(
 def leave_chat_session(
     session_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Leave a chat session."""
-    chat_service = ChatService(db)
     success = chat_service.leave_session(session_id, current_user.id)
 
     if not success:
@@ -233,10 +291,9 @@ def invite_user_to_session(
     session_id: int,
     invite_data: InviteUserRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Invite a user to a chat session (owner/admin only)."""
-    chat_service = ChatService(db)
     participant = chat_service.invite_user(session_id, current_user.id, invite_data)
 
     if not participant:
@@ -245,14 +302,7 @@ def invite_user_to_session(
             detail="Cannot invite user. Check permissions, user existence, and session capacity.",
         )
 
-    return ChatParticipantResponse(
-        id=participant.id,
-        user_id=participant.user_id,
-        username=participant.user.username if participant.user else None,
-        role=participant.role,
-        joined_at=participant.joined_at,
-        is_active=participant.is_active,
-    )
+    return _participant_from_orm(participant)
 
 
 @router.put(
@@ -264,10 +314,9 @@ def update_participant_role(
     user_id: int,
     role_data: UpdateParticipantRoleRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Update a participant's role (owner/admin only)."""
-    chat_service = ChatService(db)
     participant = chat_service.update_participant_role(
         session_id, current_user.id, user_id, role_data
     )
@@ -278,14 +327,7 @@ def update_participant_role(
             detail="Cannot update participant role. Check permissions and participant existence.",
         )
 
-    return ChatParticipantResponse(
-        id=participant.id,
-        user_id=participant.user_id,
-        username=participant.user.username if participant.user else None,
-        role=participant.role,
-        joined_at=participant.joined_at,
-        is_active=participant.is_active,
-    )
+    return _participant_from_orm(participant)
 
 
 @router.delete("/sessions/{session_id}/participants/{user_id}", response_model=dict)
@@ -293,10 +335,9 @@ def remove_participant(
     session_id: int,
     user_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Remove a participant from a chat session (owner/admin only)."""
-    chat_service = ChatService(db)
     success = chat_service.remove_participant(session_id, current_user.id, user_id)
 
     if not success:
@@ -314,32 +355,19 @@ def remove_participant(
 def get_session_participants(
     session_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Get all participants in a chat session."""
-    chat_service = ChatService(db)
-    session = chat_service.get_session_with_details(session_id, current_user.id)
+    session_participants = chat_service.get_session_participants(
+        session_id, current_user.id
+    )
 
-    if not session:
+    if session_participants is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found"
         )
 
-    participants = []
-    for participant in session.participants:
-        if participant.is_active:
-            participants.append(
-                ChatParticipantResponse(
-                    id=participant.id,
-                    user_id=participant.user_id,
-                    username=participant.user.username if participant.user else None,
-                    role=participant.role,
-                    joined_at=participant.joined_at,
-                    is_active=participant.is_active,
-                )
-            )
-
-    return participants
+    return [_participant_from_orm(participant) for participant in session_participants]
 
 
 @router.post(
@@ -351,10 +379,9 @@ def add_message_to_session(
     session_id: int,
     message_data: ChatMessageCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
     """Add a message to a chat session."""
-    chat_service = ChatService(db)
     message = chat_service.add_message(session_id, current_user.id, message_data)
 
     if not message:
@@ -363,77 +390,111 @@ def add_message_to_session(
             detail="Chat session not found or insufficient permissions",
         )
 
-    return ChatMessageResponse(
-        id=message.id,
-        session_id=message.session_id,
-        user_id=message.user_id,
-        username=message.user.username if message.user else None,
-        role=message.role,
-        content=message.content,
-        created_at=message.created_at,
+    return _message_from_orm(message)
+
+
+@router.post(
+    "/sessions/{session_id}/messages/bulk",
+    response_model=List[ChatMessageResponse],
+    status_code=status.HTTP_201_CREATED,
+)
+def add_messages_to_session(
+    session_id: int,
+    bulk_data: ChatMessageBulkCreate,
+    current_user: User = Depends(get_current_active_user),
+    chat_service: ChatService = Depends(get_chat_service),
+):
+    """Add several messages to a chat session in one request, in order."""
+    if not chat_service.can_post(session_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found or insufficient permissions",
+        )
+
+    messages = chat_service.add_messages(
+        session_id, current_user.id, bulk_data.messages
     )
+    return [_message_from_orm(message) for message in messages]
 
 
 @router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
 def get_session_messages(
     session_id: int,
-    skip: int = Query(0, ge=0),
+    response: Response,
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
     limit: int = Query(100, ge=1, le=100),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
 ):
-    """Get messages for a chat session."""
-    chat_service = ChatService(db)
+    """Get a page of messages for a chat session, oldest first.
+
+    Pages walk backwards in time: pass the X-Next-Cursor header of one
+    response as cursor to get the messages that precede it.
+    """
+    before_created_at = before_id = None
+    if cursor:
+        before_created_at, before_id = _decode_cursor(cursor)
+
     messages = chat_service.get_session_messages(
-        session_id, current_user.id, skip=skip, limit=limit
+        session_id,
+        current_user.id,
+        before_created_at=before_created_at,
+        before_id=before_id,
+        limit=limit,
     )
 
-    formatted_messages = []
-    for message in messages:
-        formatted_messages.append(
-            ChatMessageResponse(
-                id=message.id,
-                session_id=message.session_id,
-                user_id=message.user_id,
-                username=message.user.username if message.user else None,
-                role=message.role,
-                content=message.content,
-                created_at=message.created_at,
-            )
-        )
+    if len(messages) == limit:
+        oldest = messages[0]
+        response.headers["X-Next-Cursor"] = _encode_cursor(oldest.created_at, oldest.id)
 
-    return formatted_messages
+    return [_message_from_orm(message) for message in messages]
 
 
-def _format_session_response(session) -> ChatSessionResponse:
-    """Helper function to format session response with all details."""
-    participants = []
-    for participant in session.participants:
-        if participant.is_active:
-            participants.append(
-                ChatParticipantResponse(
-                    id=participant.id,
-                    user_id=participant.user_id,
-                    username=participant.user.username if participant.user else None,
-                    role=participant.role,
-                    joined_at=participant.joined_at,
-                    is_active=participant.is_active,
-                )
-            )
+# Rows come straight from the database, so the responses are built with
+# model_construct and skip a validation pass; FastAPI still checks them
+# against response_model on the way out.
+def _participant_from_orm(participant) -> ChatParticipantResponse:
+    """Build a participant response; username comes from the loaded user."""
+    user = participant.user
+    return ChatParticipantResponse.model_construct(
+        id=participant.id,
+        user_id=participant.user_id,
+        username=user.username if user else None,
+        role=participant.role,
+        joined_at=participant.joined_at,
+        is_active=participant.is_active,
+    )
 
-    messages = []
-    for message in session.messages:
-        messages.append(
-            ChatMessageResponse(
-                id=message.id,
-                session_id=message.session_id,
-                user_id=message.user_id,
-                username=message.user.username if message.user else None,
-                role=message.role,
-                content=message.content,
-                created_at=message.created_at,
-            )
-        )
+
+def _message_from_orm(message) -> ChatMessageResponse:
+    """Build a message response; username comes from the loaded user."""
+    user = message.user
+    return ChatMessageResponse.model_construct(
+        id=message.id,
+        session_id=message.session_id,
+        user_id=message.user_id,
+        username=user.username if user else None,
+        role=message.role,
+        content=message.content,
+        created_at=message.created_at,
+    )
+
+
+def _format_session_response(chat_service: ChatService, session) -> ChatSessionResponse:
+    """Helper function to format session response with all details."""
+    participants = [
+        _participant_from_orm(participant)
+        for participant in session.active_participants
+    ]
+
+    # Fetch one extra message to know whether older ones remain
+    recent_messages = chat_service.get_recent_messages(
+        session.id, SESSION_DETAIL_MESSAGE_LIMIT + 1
+    )
+    has_more = len(recent_messages) > SESSION_DETAIL_MESSAGE_LIMIT
+    if has_more:
+        recent_messages = recent_messages[1:]
+    messages = [_message_from_orm(message) for message in recent_messages]
 
     return ChatSessionResponse(
         id=session.id,
@@ -448,5 +509,6 @@ def _format_session_response(session) -> ChatSessionResponse:
         updated_at=session.updated_at,
         participants=participants,
         messages=messages,
+        has_more=has_more,
         participant_count=len(participants),
     )
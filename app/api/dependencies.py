@@ -1,17 +1,135 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import Optional
-from app.core.database import get_db
+from typing import Optional, Tuple
+from cachetools import TTLCache
+from datetime import datetime
+import hashlib
+import logging
+import orjson
+import threading
+import time
+from app.core.redis import redis_manager
 from app.core.security import verify_token
-from app.services.user_service import UserService
+from app.models.user import User
+from app.services.user_service import UserService, get_user_service
+
+log = logging.getLogger("insurge.auth")
 
 security = HTTPBearer()
 
+# Users resolved from a bearer token, keyed by a digest of the token so raw
+# tokens are never kept in memory. Repeat requests within the TTL skip JWT
+# verification and the user lookup.
+TOKEN_CACHE_TTL_SECONDS = 30
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
+
+# (email, is_active, token_version) per user id, so /auth/refresh can validate
+# a refresh token without touching the database on a hit.
+REFRESH_STATE_TTL_SECONDS = 60
+_refresh_state_cache = TTLCache(maxsize=10_000, ttl=REFRESH_STATE_TTL_SECONDS)
+
+
+# Users shared across workers as JSON in Redis under user:{id}. The password
+# hash is never cached.
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_FIELDS = (
+    "id",
+    "email",
+    "username",
+    "first_name",
+    "last_name",
+    "is_active",
+    "is_verified",
+    "token_version",
+    "created_at",
+    "updated_at",
+)
+
+# Invalidation overwrites user:{id} with this marker instead of deleting it.
+# Fills only write an absent key, so a fill whose database read predates the
+# invalidation cannot bring back the stale user while the marker lives.
+USER_CACHE_TOMBSTONE = "-"
+USER_CACHE_TOMBSTONE_TTL_SECONDS = 10
+
+
+def _user_cache_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+async def invalidate_cached_user(user_id: int) -> None:
+    """Drop cached users for user_id after their profile or status changes."""
+    with _token_cache_lock:
+        stale_keys = [key for key, user in _token_cache.items() if user.id == user_id]
+        for key in stale_keys:
+            _token_cache.pop(key, None)
+        _refresh_state_cache.pop(user_id, None)
+    try:
+        await redis_manager.set(
+            _user_cache_key(user_id),
+            USER_CACHE_TOMBSTONE,
+            expire=USER_CACHE_TOMBSTONE_TTL_SECONDS,
+        )
+    except Exception as e:
+        log.warning("Failed to invalidate cached user %s: %s", user_id, e)
+
+
+async def load_user(user_service: UserService, user_id: int) -> Optional[User]:
+    """Get a user from the Redis cache, falling back to the database.
+
+    Cache hits are transient User instances that are not attached to a session.
+    """
+    key = _user_cache_key(user_id)
+    try:
+        cached = await redis_manager.get(key)
+    except Exception:
+        cached = None
+    if cached and cached != USER_CACHE_TOMBSTONE:
+        data = orjson.loads(cached)
+        for field in ("created_at", "updated_at"):
+            if data[field]:
+                data[field] = datetime.fromisoformat(data[field])
+        return User(**data)
+
+    user = await run_in_threadpool(user_service.get_user_by_id, user_id)
+    if user is not None:
+        data = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+        # Awaited, not queued, and never over a tombstone: either way a fill
+        # could land after a later invalidation and cache a stale user
+        try:
+            await redis_manager.redis_client.set(
+                key, orjson.dumps(data).decode(), ex=USER_CACHE_TTL_SECONDS, nx=True
+            )
+        except Exception:
+            pass
+    return user
+
+
+def get_refresh_state(
+    user_service: UserService, user_id: int
+) -> Optional[Tuple[str, bool, int]]:
+    """Get the cached (email, is_active, token_version) of a user."""
+    with _token_cache_lock:
+        state = _refresh_state_cache.get(user_id)
+    if state is None:
+        row = user_service.get_token_state(user_id)
+        if row is None:
+            return None
+        state = tuple(row)
+        with _token_cache_lock:
+            _refresh_state_cache[user_id] = state
+    return state
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
+    user_service: UserService = Depends(get_user_service),
 ):
     """Dependency to get current authenticated user."""
     credentials_exception = HTTPException(
@@ -20,8 +138,14 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    token = credentials.credentials
+    cache_key = _token_cache_key(token)
+    with _token_cache_lock:
+        cached_user = _token_cache.get(cache_key)
+    if cached_user is not None:
+        return cached_user
+
     try:
-        token = credentials.credentials
         payload = verify_token(token)
         if payload is None:
             raise credentials_exception
@@ -33,14 +157,21 @@ async def get_current_user(
     except Exception:
         raise credentials_exception
 
-    user_service = UserService(db)
-    user = user_service.get_user_by_id(user_id)
+    user = await load_user(user_service, user_id)
     if user is None:
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
+
+    # Only cache tokens that outlive the cache entry, and detach the user so
+    # commits later in this request don't expire the cached instance
+    if payload.get("exp", 0) - time.time() > TOKEN_CACHE_TTL_SECONDS:
+        if user in user_service.db:
+            user_service.db.expunge(user)
+        with _token_cache_lock:
+            _token_cache[cache_key] = user
     return user
 
 
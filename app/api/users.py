@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from typing import List
-from app.core.database import get_db
-from app.api.dependencies import get_current_active_user
+from app.api.dependencies import get_current_active_user, invalidate_cached_user
 from app.schemas.user import UserResponse, UserUpdate
-from app.services.user_service import UserService
+from app.services.user_service import UserService, get_user_service
 from app.models.user import User
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -17,53 +17,72 @@ def get_current_user_profile(current_user: User = Depends(get_current_active_use
 
 
 @router.put("/me", response_model=UserResponse)
-def update_current_user_profile(
+async def update_current_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    user_service: UserService = Depends(get_user_service),
 ):
     """Update current user's profile."""
-    user_service = UserService(db)
+    changed = {}
+    if user_update.email and user_update.email != current_user.email:
+        changed["email"] = user_update.email
+    if user_update.username and user_update.username != current_user.username:
+        changed["username"] = user_update.username
+
+    # Only values the bloom filter can't rule out need a database check
+    maybe_taken = await user_service.maybe_taken(changed) if changed else set()
 
     # Check if email is being changed and if it's already taken
-    if user_update.email and user_update.email != current_user.email:
-        if user_service.is_email_taken(
-            user_update.email, exclude_user_id=current_user.id
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered",
-            )
+    if "email" in maybe_taken and await run_in_threadpool(
+        user_service.is_email_taken, user_update.email, current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered",
+        )
 
     # Check if username is being changed and if it's already taken
-    if user_update.username and user_update.username != current_user.username:
-        if user_service.is_username_taken(
-            user_update.username, exclude_user_id=current_user.id
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
-            )
+    if "username" in maybe_taken and await run_in_threadpool(
+        user_service.is_username_taken, user_update.username, current_user.id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
+        )
 
-    updated_user = user_service.update_user(current_user.id, user_update)
+    try:
+        updated_user = await run_in_threadpool(
+            user_service.update_user, current_user.id, user_update
+        )
+    except IntegrityError:
+        # The unique indexes still guard against a stale filter
+        await run_in_threadpool(user_service.db.rollback)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email or username already taken",
+        )
     if not updated_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
+    if changed:
+        await user_service.add_to_bloom(updated_user.email, updated_user.username)
+    await invalidate_cached_user(current_user.id)
 
     return updated_user
 
 
 @router.delete("/me", status_code=status.HTTP_204_NO_CONTENT)
-def deactivate_current_user(
-    current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)
+async def deactivate_current_user(
+    current_user: User = Depends(get_current_active_user),
+    user_service: UserService = Depends(get_user_service),
 ):
     """Deactivate current user account."""
-    user_service = UserService(db)
-    success = user_service.deactivate_user(current_user.id)
+    success = await run_in_threadpool(user_service.deactivate_user, current_user.id)
 
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
+    await invalidate_cached_user(current_user.id)
 
     return None
@@ -1,19 +1,49 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 from typing import List, Optional
+from functools import lru_cache
 import os
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(
+        env_file=".env", case_sensitive=False, frozen=True
+    )
+
     # Database
     database_url: str = Field(
         description="Database connection URL",
     )
+    db_pool_size: int = Field(default=20, description="Connections kept per worker")
+    db_max_overflow: int = Field(
+        default=10, description="Extra connections allowed above the pool size"
+    )
+    db_pool_timeout: int = Field(
+        default=30, description="Seconds to wait for a pooled connection"
+    )
+    db_pool_recycle: int = Field(
+        default=1800, description="Seconds after which connections are recycled"
+    )
 
     # Redis
     redis_url: str = Field(
         description="Redis connection URL"
     )
+    redis_max_connections: int = Field(
+        default=50, description="Maximum connections in the Redis pool"
+    )
+    redis_health_check_interval: int = Field(
+        default=30, description="Seconds idle before a pooled connection is checked"
+    )
+    redis_batch_size: int = Field(
+        default=500, description="Commands sent per Redis pipeline round trip"
+    )
+    redis_flush_batch_size: int = Field(
+        default=256, description="Most queued writes sent in one background flush"
+    )
+    redis_flush_interval_ms: int = Field(
+        default=5, description="Milliseconds queued writes wait to share a flush"
+    )
 
     # JWT
     secret_key: str = Field(
@@ -26,24 +56,59 @@ class Settings(BaseSettings):
     refresh_token_expire_days: int = Field(
         description="Refresh token expiration in days"
     )
+    bcrypt_rounds: int = Field(default=12, description="bcrypt cost factor")
+    password_hash_workers: int = Field(
+        default_factory=lambda: os.cpu_count() or 1,
+        description="Threads dedicated to password hashing and verification",
+    )
 
     # CORS
     allowed_origins: List[str] = Field(
         description="Allowed CORS origins",
     )
+    cors_origin_regex: Optional[str] = Field(
+        default=None,
+        description="Regex of additionally allowed CORS origins, e.g. subdomains",
+    )
 
     # Environment
     environment: str = Field(description="Environment")
     debug: bool = Field(description="Debug mode")
+    log_level: str = Field(
+        default="INFO", description="Level of the application's insurge.* loggers"
+    )
+
+    # WebSockets
+    websocket_redis_bus: bool = Field(
+        default=False,
+        description="Fan WebSocket messages out over Redis pub/sub across workers",
+    )
+    websocket_chunk_wait_ms: int = Field(
+        default=15, description="Milliseconds streamed AI chunks wait to share a frame"
+    )
+    websocket_chunk_max_chars: int = Field(
+        default=4096, description="Buffered AI reply characters that force a frame"
+    )
+
+    # Server
+    worker_processes: int = Field(
+        default=1, description="Uvicorn worker processes when run directly"
+    )
+    threadpool_size: int = Field(
+        default=40,
+        description="Worker threads available to sync route handlers and DB calls",
+    )
 
     # Optional AI
     openai_api_key: Optional[str] = Field(
         default=None, description="OpenAI API key (optional)"
     )
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings once; later calls reuse the validated instance."""
+    return Settings()
 
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
\ No newline at end of file
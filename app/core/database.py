@@ -1,18 +1,33 @@
+from datetime import datetime, timezone
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from app.core.config import settings
 
+# Engines are created at import time, i.e. once per worker process (the app is
+# not preloaded in the gunicorn master), so connections are never shared
+# across forked workers.
+engine_options = {}
+if make_url(settings.database_url).get_backend_name() != "sqlite":
+    engine_options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
 # Sync database setup
-engine = create_engine(settings.database_url)
+engine = create_engine(settings.database_url, **engine_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Async database setup
 async_database_url = settings.database_url.replace(
     "postgresql://", "postgresql+asyncpg://"
 )
-async_engine = create_async_engine(async_database_url)
+async_engine = create_async_engine(async_database_url, **engine_options)
 AsyncSessionLocal = sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -20,6 +35,11 @@ AsyncSessionLocal = sessionmaker(
 Base = declarative_base()
 
 
+def utcnow() -> datetime:
+    """Current UTC time, for Python-side timestamp column defaults."""
+    return datetime.now(timezone.utc)
+
+
 # Dependency for sync database session
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,43 @@
+from typing import Any, Callable, Sequence
+from alembic import op
+from sqlalchemy import Select
+from sqlalchemy.engine import Connection, Row
+
+
+def paginated_backfill(
+    select_stmt: Select,
+    key_column: Any,
+    mutate_fn: Callable[[Connection, Sequence[Row]], None],
+    page_size: int = 500,
+) -> int:
+    """Apply mutate_fn to the rows of select_stmt one page at a time.
+
+    Meant to be called from an Alembic upgrade()/downgrade() in online mode.
+    Pages are read by keyset on key_column (which must be unique and part of
+    the selected columns) inside an autocommit block, so at most page_size
+    rows are held in memory and every page's writes are committed as soon as
+    they are issued instead of in one long transaction holding locks on the
+    whole table. mutate_fn receives the connection and the page's rows; issue
+    the page's writes as a single executemany where possible.
+
+    Returns the number of rows processed.
+    """
+    connection = op.get_bind()
+    processed = 0
+    last_key = None
+
+    with op.get_context().autocommit_block():
+        while True:
+            page_stmt = select_stmt.order_by(key_column).limit(page_size)
+            if last_key is not None:
+                page_stmt = page_stmt.where(key_column > last_key)
+
+            rows = connection.execute(page_stmt).all()
+            if not rows:
+                break
+
+            mutate_fn(connection, rows)
+            processed += len(rows)
+            last_key = rows[-1]._mapping[key_column]
+
+    return processed
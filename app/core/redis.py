@@ -1,46 +1,139 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import contextlib
+import logging
 import redis.asyncio as redis
 from app.core.config import settings
 
+log = logging.getLogger("insurge.redis")
+
 
 class RedisManager:
     def __init__(self):
-        self.redis_client = None
+        # Building the pool and client does no I/O; connections are opened on
+        # first use, so the client is always set and no call needs a guard
+        self.pool = redis.ConnectionPool.from_url(
+            settings.redis_url,
+            max_connections=settings.redis_max_connections,
+            health_check_interval=settings.redis_health_check_interval,
+            encoding="utf-8",
+            decode_responses=True,
+        )
+        self.redis_client = redis.Redis(connection_pool=self.pool)
+        # Fire-and-forget SETs waiting for the background flusher
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._flusher: Optional[asyncio.Task] = None
+        # Writes the flusher has dequeued but not yet sent; kept here so a
+        # cancelled flusher does not take them down with it
+        self._inflight: List[Tuple] = []
 
     async def connect(self):
-        """Connect to Redis."""
-        self.redis_client = redis.from_url(
-            settings.redis_url, encoding="utf-8", decode_responses=True
-        )
+        """Return the shared client; connections are pooled and lazy."""
+        self._start_flusher()
         return self.redis_client
 
     async def disconnect(self):
-        """Disconnect from Redis."""
-        if self.redis_client:
-            await self.redis_client.close()
+        """Flush queued writes, then close the client and every pooled connection."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        batch, self._inflight = self._inflight, []
+        if batch:
+            await self._flush_pending(batch)
+        while not self._pending.empty():
+            await self._flush_pending()
+        await self.redis_client.close()
+        await self.pool.disconnect()
 
     async def get(self, key: str):
         """Get a value from Redis."""
-        if not self.redis_client:
-            await self.connect()
         return await self.redis_client.get(key)
 
     async def set(self, key: str, value: str, expire: int = None):
         """Set a value in Redis with optional expiration."""
-        if not self.redis_client:
-            await self.connect()
         return await self.redis_client.set(key, value, ex=expire)
 
     async def delete(self, key: str):
         """Delete a key from Redis."""
-        if not self.redis_client:
-            await self.connect()
         return await self.redis_client.delete(key)
 
     async def exists(self, key: str):
         """Check if a key exists in Redis."""
-        if not self.redis_client:
-            await self.connect()
         return await self.redis_client.exists(key)
 
+    def set_async_fire_and_forget(self, key: str, value: str, expire: int = None):
+        """Queue a SET for the next background flush without awaiting Redis.
+
+        Failed flushes are logged and dropped, so only use this for data that
+        can be lost or recomputed, such as caches.
+        """
+        self._start_flusher()
+        self._pending.put_nowait((key, value, expire))
+
+    def _start_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        """Send queued writes every flush interval or flush batch, whichever first."""
+        interval = settings.redis_flush_interval_ms / 1000
+        while True:
+            self._inflight = [await self._pending.get()]
+            if self._pending.qsize() < settings.redis_flush_batch_size - 1:
+                await asyncio.sleep(interval)
+            await self._flush_pending(self._inflight)
+            self._inflight = []
+
+    async def _flush_pending(self, batch: Optional[List[Tuple]] = None):
+        batch = batch or []
+        limit = settings.redis_flush_batch_size
+        while len(batch) < limit and not self._pending.empty():
+            batch.append(self._pending.get_nowait())
+        try:
+            await self.batch_exec(
+                ("set", (key, value), {"ex": expire}) for key, value, expire in batch
+            )
+        except Exception as e:
+            log.warning("Dropped %d queued Redis writes: %s", len(batch), e)
+
+    async def pipeline(self):
+        """Get a non-transactional pipeline that sends queued commands at once."""
+        return self.redis_client.pipeline(transaction=False)
+
+    async def mget(self, keys: Sequence[str]) -> List[Any]:
+        """Get many values, in order, with one round trip per batch."""
+        results = await self.batch_exec(
+            ("mget", tuple(keys[i : i + settings.redis_batch_size]))
+            for i in range(0, len(keys), settings.redis_batch_size)
+        )
+        return [value for chunk in results for value in chunk]
+
+    async def mset(self, mapping: Dict[str, str], expire: int = None) -> None:
+        """Set many values with an optional shared expiration."""
+        await self.batch_exec(
+            ("set", (key, value), {"ex": expire}) for key, value in mapping.items()
+        )
+
+    async def batch_exec(self, commands: Iterable[Tuple]) -> List[Any]:
+        """Run (name, args[, kwargs]) commands pipelined, redis_batch_size at a time.
+
+        Returns the command results in order.
+        """
+        pipe = await self.pipeline()
+        results = []
+        queued = 0
+        async with pipe:
+            for name, args, *kwargs in commands:
+                getattr(pipe, name)(*args, **(kwargs[0] if kwargs else {}))
+                queued += 1
+                if queued == settings.redis_batch_size:
+                    results.extend(await pipe.execute())
+                    queued = 0
+            if queued:
+                results.extend(await pipe.execute())
+        return results
+
 
 redis_manager = RedisManager()
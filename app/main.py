@@ -1,24 +1,59 @@
 from fastapi import FastAPI, WebSocket, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from contextlib import asynccontextmanager
+from anyio import to_thread
 
+import asyncio
+import logging
+import logging.config
 import os
 
 from app.core.config import settings
-from app.core.database import engine, Base, get_db, SessionLocal
+from app.core.database import engine, Base, get_db, get_async_db, SessionLocal
 from app.core.redis import redis_manager
 from app.api import auth, users, chat
+from app.services.user_service import seed_user_bloom
 from app.websockets.chat_handler import websocket_endpoint
-
+from app.websockets.connection_manager import manager
+
+log = logging.getLogger("insurge.startup")
+
+LOGGING_CONFIG = {
+    "version": 1,
+    # Keep uvicorn's own loggers and handlers as they are
+    "disable_existing_loggers": False,
+    "formatters": {
+        "default": {"format": "%(asctime)s %(levelname)s %(name)s: %(message)s"},
+    },
+    "handlers": {
+        "default": {"class": "logging.StreamHandler", "formatter": "default"},
+    },
+    "loggers": {
+        "insurge": {
+            "handlers": ["default"],
+            "level": settings.log_level.upper(),
+            "propagate": False,
+        },
+    },
+}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    logging.config.dictConfig(LOGGING_CONFIG)
     try:
+        # Sync routes and their blocking DB calls run in this threadpool, so
+        # size it for the expected DB concurrency instead of anyio's default
+        to_thread.current_default_thread_limiter().total_tokens = (
+            settings.threadpool_size
+        )
+
         await redis_manager.connect()
         
         # Test database connection
@@ -26,10 +61,13 @@ async def lifespan(app: FastAPI):
         try:
             db.execute(text("SELECT 1"))
             db_status = "Connected ✅"
-            # CREATE DATABASE TABLES - Add this section
-            print("🔧 Creating database tables...")
-            Base.metadata.create_all(bind=engine)
-            print("✅ Database tables created successfully!")
+            # The schema is owned by Alembic (`alembic upgrade head` runs before
+            # the server starts); create_all is only a local convenience
+            if (
+                settings.environment == "development"
+                and os.environ.get("INIT_DB") == "1"
+            ):
+                Base.metadata.create_all(bind=engine)
         except Exception as db_error:
             db_status = f"Failed ❌: {str(db_error)}"
         finally:
@@ -41,21 +79,32 @@ async def lifespan(app: FastAPI):
             redis_status = "Connected ✅"
         except Exception as redis_error:
             redis_status = f"Failed ❌: {str(redis_error)}"
+
+        bloom_seed_task = asyncio.create_task(seed_user_bloom())
         
-        print("🚀 Application started successfully!")
-        print(f"📊 Environment: {settings.environment}")
-        print(f"🔗 Database: {db_status}")
-        print(f"🔴 Redis: {redis_status}")
+        log.info(
+            "Application started (environment=%s, database=%s, redis=%s)",
+            settings.environment,
+            db_status,
+            redis_status,
+            extra={
+                "environment": settings.environment,
+                "database": db_status,
+                "redis": redis_status,
+            },
+        )
         
-    except Exception as e:
-        print(f"❌ Startup failed: {str(e)}")
+    except Exception:
+        log.exception("Startup failed")
         raise
     
     yield
     
     # Shutdown
+    bloom_seed_task.cancel()
+    await manager.close()
     await redis_manager.disconnect()
-    print("👋 Application shutting down...")
+    log.info("Application shutting down")
 
 
 # Create FastAPI app
@@ -64,53 +113,58 @@ app = FastAPI(
     description="A comprehensive backend API with JWT authentication, PostgreSQL, and WebSocket chat functionality",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
 )
 
-# Add CORS middleware
+# Compress larger bodies such as session detail with its message history.
+# Added before CORS so CORS is the outer middleware and sees the final headers.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Local dev servers on any port are allowed in debug mode
+LOCALHOST_ORIGIN_REGEX = r"https?://(localhost|127\.0\.0\.1)(:\d+)?"
+
+# Add CORS middleware. Exact origins are a set lookup and the regex is compiled
+# once; a wildcard origin would make every response echo the request Origin.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=(
-        settings.allowed_origins + ["*"] if settings.debug else settings.allowed_origins
-    ),
+    allow_origins=settings.allowed_origins,
+    allow_origin_regex=settings.cors_origin_regex
+    or (LOCALHOST_ORIGIN_REGEX if settings.debug else None),
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+    # Preflight OPTIONS requests are answered by the middleware itself
+    allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
 # Health check endpoint
 @app.get("/health", tags=["health"])
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """Health check endpoint."""
-    try:
-        # Test database connection
-        db.execute(text("SELECT 1"))
-
-        # Test Redis connection
-        await redis_manager.get("health_check")
-
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "healthy",
-                "database": "connected",
-                "redis": "connected",
-                "environment": settings.environment,
-                "version": "1.0.0",
-            },
-        )
-    except Exception as e:
-        return JSONResponse(
-            status_code=503,
-            content={
-                "status": "unhealthy",
-                "error": str(e),
-                "environment": settings.environment,
-                "version": "1.0.0",
-            },
-        )
+    # The probes are independent, so run them concurrently: the database on the
+    # asyncpg engine and Redis on its pool, neither touching the threadpool
+    db_result, redis_result = await asyncio.gather(
+        db.execute(text("SELECT 1")),
+        redis_manager.get("health_check"),
+        return_exceptions=True,
+    )
+    db_ok = not isinstance(db_result, Exception)
+    redis_ok = not isinstance(redis_result, Exception)
+
+    content = {
+        "status": "healthy" if db_ok and redis_ok else "unhealthy",
+        "database": "connected" if db_ok else "disconnected",
+        "redis": "connected" if redis_ok else "disconnected",
+        "environment": settings.environment,
+        "version": "1.0.0",
+    }
+    errors = [str(r) for r in (db_result, redis_result) if isinstance(r, Exception)]
+    if errors:
+        content["error"] = "; ".join(errors)
+    return ORJSONResponse(status_code=200 if not errors else 503, content=content)
 
 
 # Root endpoint
@@ -137,21 +191,22 @@ async def websocket_chat(
     websocket: WebSocket,
     token: str,
     session_id: int = None,
+    binary: bool = False,
     db: Session = Depends(get_db),
 ):
     """WebSocket endpoint for real-time chat."""
-    await websocket_endpoint(websocket, token, session_id, db)
+    await websocket_endpoint(websocket, token, session_id, db, binary)
 
 
 # Custom exception handlers
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
-    return JSONResponse(status_code=404, content={"detail": "Endpoint not found"})
+    return ORJSONResponse(status_code=404, content={"detail": "Endpoint not found"})
 
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
-    return JSONResponse(status_code=500, content={"detail": "Internal server error"})
+    return ORJSONResponse(status_code=500, content={"detail": "Internal server error"})
 
 
 if __name__ == "__main__":
@@ -162,5 +217,9 @@ if __name__ == "__main__":
         host="127.0.0.1",
         port=8000,
         reload=settings.debug,
+        # uvicorn ignores workers when reloading
+        workers=settings.worker_processes,
+        loop="uvloop",
+        http="httptools",
         log_level="info",
     )
@@ -1,7 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Text,
+    ForeignKey,
+    Enum,
+    Index,
+    CheckConstraint,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, utcnow
 import enum
 
 
@@ -13,15 +23,27 @@ class MessageRole(enum.Enum):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Declared so create_all matches migrations 002, 003 and 007
+    __table_args__ = (
+        Index("idx_chat_messages_session_created_id", "session_id", "created_at", "id"),
+        Index("idx_chat_messages_user_id", "user_id"),
+        CheckConstraint(
+            "role IN ('USER', 'ASSISTANT', 'SYSTEM')", name="ck_chat_messages_role"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     user_id = Column(
         Integer, ForeignKey("users.id"), nullable=True
     )  # Null for system messages
-    role = Column(Enum(MessageRole), nullable=False)
+    role = Column(Enum(MessageRole, native_enum=False, length=20), nullable=False)
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set in Python so every dialect stores it with the precision and format
+    # the (created_at, id) page cursors are bound with
+    created_at = Column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now()
+    )
 
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
@@ -1,4 +1,15 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Boolean, Enum
+from sqlalchemy import (
+    Column,
+    Integer,
+    ForeignKey,
+    DateTime,
+    Boolean,
+    Enum,
+    Index,
+    CheckConstraint,
+    UniqueConstraint,
+    text,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -14,11 +25,42 @@ class ParticipantRole(enum.Enum):
 
 class ChatParticipant(Base):
     __tablename__ = "chat_participants"
+    # Same names as migrations 002-004 and 008; partial and covering indexes
+    # only take effect on PostgreSQL
+    __table_args__ = (
+        UniqueConstraint("session_id", "user_id", name="unique_session_user"),
+        Index(
+            "idx_participants_session_active",
+            "session_id",
+            postgresql_where=text("is_active"),
+        ),
+        Index(
+            "idx_participants_user_session_active",
+            "user_id",
+            "session_id",
+            postgresql_where=text("is_active"),
+        ),
+        Index(
+            "idx_participants_session_user_cover",
+            "session_id",
+            "user_id",
+            postgresql_include=["is_active", "role"],
+        ),
+        CheckConstraint(
+            "role IN ('OWNER', 'ADMIN', 'MEMBER', 'VIEWER')",
+            name="ck_chat_participants_role",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    role = Column(Enum(ParticipantRole), default=ParticipantRole.MEMBER, nullable=False)
+    role = Column(
+        Enum(ParticipantRole, native_enum=False, length=20),
+        default=ParticipantRole.MEMBER,
+        server_default=ParticipantRole.MEMBER.name,
+        nullable=False,
+    )
     joined_at = Column(DateTime(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True)
 
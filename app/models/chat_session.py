@@ -7,10 +7,12 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     Enum,
+    Index,
+    CheckConstraint,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.core.database import Base
+from app.core.database import Base, utcnow
 import enum
 
 
@@ -22,19 +24,39 @@ class SessionType(enum.Enum):
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        Index("idx_chat_sessions_type", "session_type"),
+        CheckConstraint(
+            "session_type IN ('PRIVATE', 'PUBLIC', 'INVITE_ONLY')",
+            name="ck_chat_sessions_session_type",
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, default="New Chat")
     description = Column(Text, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # Owner
     session_type = Column(
-        Enum(SessionType), default=SessionType.PRIVATE, nullable=False
+        Enum(SessionType, native_enum=False, length=20),
+        default=SessionType.PRIVATE,
+        server_default=SessionType.PRIVATE.name,
+        nullable=False,
     )
     max_participants = Column(Integer, default=10)  # Maximum number of participants
+    # Denormalized counters, maintained by ChatService alongside each change
+    participant_count = Column(Integer, nullable=False, default=0, server_default="0")
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set in Python so every dialect stores them with the precision and format
+    # the (updated_at, id) page cursors are bound with
+    created_at = Column(
+        DateTime(timezone=True), default=utcnow, server_default=func.now()
+    )
     updated_at = Column(
-        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
+        onupdate=utcnow,
     )
 
     # Relationships
@@ -45,6 +67,13 @@ class ChatSession(Base):
     participants = relationship(
         "ChatParticipant", back_populates="session", cascade="all, delete-orphan"
     )
+    # Read-only view of participants who haven't left or been removed
+    active_participants = relationship(
+        "ChatParticipant",
+        primaryjoin="and_(ChatSession.id == ChatParticipant.session_id, "
+        "ChatParticipant.is_active == True)",
+        viewonly=True,
+    )
 
     def __repr__(self):
         return (
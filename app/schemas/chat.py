@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import AliasPath, BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import datetime
 from app.models.chat_message import MessageRole
@@ -17,6 +17,10 @@ class ChatSessionCreate(ChatSessionBase):
     pass
 
 
+class ChatSessionBulkCreate(BaseModel):
+    sessions: List[ChatSessionCreate] = Field(..., min_length=1, max_length=50)
+
+
 class ChatSessionUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=200)
     description: Optional[str] = Field(None, max_length=1000)
@@ -29,15 +33,18 @@ class ChatParticipantBase(BaseModel):
 
 
 class ChatParticipantResponse(ChatParticipantBase):
+    model_config = ConfigDict(
+        from_attributes=True, populate_by_name=True, frozen=True, extra="forbid"
+    )
+
     id: int
     user_id: int
-    username: Optional[str] = None  # Will be populated from user relationship
+    username: Optional[str] = Field(
+        None, validation_alias=AliasPath("user", "username")
+    )  # Populated from the user relationship
     joined_at: datetime
     is_active: bool
 
-    class Config:
-        from_attributes = True
-
 
 class ChatMessageBase(BaseModel):
     role: MessageRole
@@ -48,18 +55,27 @@ class ChatMessageCreate(ChatMessageBase):
     pass
 
 
+class ChatMessageBulkCreate(BaseModel):
+    messages: List[ChatMessageCreate] = Field(..., min_length=1, max_length=100)
+
+
 class ChatMessageResponse(ChatMessageBase):
+    model_config = ConfigDict(
+        from_attributes=True, populate_by_name=True, frozen=True, extra="forbid"
+    )
+
     id: int
     session_id: int
     user_id: Optional[int] = None
-    username: Optional[str] = None  # Will be populated from user relationship
+    username: Optional[str] = Field(
+        None, validation_alias=AliasPath("user", "username")
+    )  # Populated from the user relationship
     created_at: datetime
 
-    class Config:
-        from_attributes = True
-
 
 class ChatSessionResponse(ChatSessionBase):
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra="forbid")
+
     id: int
     user_id: int
     owner_username: Optional[str] = None  # Will be populated from owner relationship
@@ -67,14 +83,14 @@ class ChatSessionResponse(ChatSessionBase):
     created_at: datetime
     updated_at: datetime
     participants: List[ChatParticipantResponse] = []
-    messages: List[ChatMessageResponse] = []
+    messages: List[ChatMessageResponse] = []  # Most recent page, oldest first
+    has_more: bool = False  # Older messages exist; page them via /messages
     participant_count: int = 0
 
-    class Config:
-        from_attributes = True
-
 
 class ChatSessionListResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True, extra="forbid")
+
     id: int
     title: str
     description: Optional[str] = None
@@ -85,9 +101,6 @@ class ChatSessionListResponse(BaseModel):
     message_count: int = 0
     participant_count: int = 0
 
-    class Config:
-        from_attributes = True
-
 
 class JoinSessionRequest(BaseModel):
     pass  # No additional fields needed for joining
@@ -1,8 +1,9 @@
 # Example AI Integration Service
 # This file shows how to integrate with OpenAI or other AI services
 
-import asyncio
-from typing import List, Dict, Optional
+import random
+import re
+from typing import AsyncIterator, List, Dict, Optional
 from app.core.config import settings
 
 # Optional OpenAI import - only import if package is available
@@ -17,6 +18,15 @@ except ImportError:
     openai = None
 
 
+# Keyword groups for the mock responder, matched against the message's words
+_WORD_RE = re.compile(r"[a-z]+")
+_GREETINGS = frozenset({"hello", "hi", "hey"})
+_THANKS = frozenset({"thanks", "thank"})
+_HELP = frozenset({"help", "assist", "support"})
+_WEATHER = frozenset({"weather", "temperature"})
+_TIME = frozenset({"time", "date"})
+
+
 class AIService:
     """AI Service for generating chat responses."""
 
@@ -85,21 +95,30 @@ class AIService:
             print(f"AI Service error: {e}")
             return "I apologize, but I'm having trouble processing your request right now. Please try again later."
 
+    async def stream_response(
+        self, messages: List[Dict[str, str]], user_message: str
+    ) -> AsyncIterator[str]:
+        """
+        Stream an AI response in chunks as they are generated.
+
+        The mock responder has the whole reply at once and yields it as one
+        chunk; a streaming client (e.g. OpenAI with stream=True) should yield
+        each content delta as it arrives instead.
+        """
+        yield await self.generate_response(messages, user_message)
+
     async def _generate_mock_response(self, user_message: str) -> str:
         """Generate a mock AI response for demonstration."""
-        # Simulate AI processing delay
-        await asyncio.sleep(1)
-
         # Simple response generation based on keywords
-        message_lower = user_message.lower()
+        words = set(_WORD_RE.findall(user_message.lower()))
 
-        if any(word in message_lower for word in ["hello", "hi", "hey"]):
+        if not words.isdisjoint(_GREETINGS):
             responses = [
                 "Hello! How can I assist you today?",
                 "Hi there! What would you like to know?",
                 "Hey! I'm here to help. What's on your mind?",
             ]
-        elif any(word in message_lower for word in ["thanks", "thank you"]):
+        elif not words.isdisjoint(_THANKS):
             responses = [
                 "You're welcome! Is there anything else I can help you with?",
                 "Happy to help! Let me know if you need anything else.",
@@ -111,18 +130,18 @@ class AIService:
                 "I'd be happy to help answer your question. Based on what you're asking...",
                 "Interesting question! Here's what I can tell you...",
             ]
-        elif any(word in message_lower for word in ["help", "assist", "support"]):
+        elif not words.isdisjoint(_HELP):
             responses = [
                 "I'm here to help! You can ask me about various topics, and I'll do my best to provide useful information.",
                 "I'd be happy to assist you. What specific area would you like help with?",
                 "Sure! I can help with information, explanations, problem-solving, and more. What do you need?",
             ]
-        elif any(word in message_lower for word in ["weather", "temperature"]):
+        elif not words.isdisjoint(_WEATHER):
             responses = [
                 "I don't have access to real-time weather data, but I'd recommend checking a weather service like Weather.com or your local weather app.",
                 "For current weather information, I'd suggest checking a reliable weather source in your area.",
             ]
-        elif any(word in message_lower for word in ["time", "date"]):
+        elif not words.isdisjoint(_TIME):
             responses = [
                 "I don't have access to real-time information, but you can check your device's clock or search online for the current time and date.",
                 "For current time and date information, please check your system clock or a reliable online source.",
@@ -136,8 +155,6 @@ class AIService:
                 "I see what you're getting at. Let me think about the best way to address your question...",
             ]
 
-        import random
-
         return random.choice(responses)
 
     async def generate_chat_title(self, first_message: str) -> str:
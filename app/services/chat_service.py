@@ -1,9 +1,14 @@
 from typing import List, Optional, Tuple
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, func, and_, or_
+from datetime import datetime
+from fastapi import Depends
+from sqlalchemy.orm import Session, aliased, joinedload, raiseload, selectinload
+from sqlalchemy import desc, func, and_, or_, exists, lambda_stmt, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.models.chat_session import ChatSession, SessionType
 from app.models.chat_message import ChatMessage, MessageRole
 from app.models.chat_participant import ChatParticipant, ParticipantRole
+from app.core.database import get_db
 from app.models.user import User
 from app.schemas.chat import (
     ChatSessionCreate,
@@ -13,6 +18,9 @@ from app.schemas.chat import (
     UpdateParticipantRoleRequest,
 )
 
+# Dialect INSERT constructs that support ON CONFLICT upserts
+UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
 
 class ChatService:
     def __init__(self, db: Session):
@@ -22,26 +30,61 @@ class ChatService:
         self, user_id: int, session_data: ChatSessionCreate
     ) -> ChatSession:
         """Create a new chat session."""
-        db_session = ChatSession(
-            title=session_data.title,
-            description=session_data.description,
-            user_id=user_id,
-            session_type=session_data.session_type,
-            max_participants=session_data.max_participants,
-        )
+        return self.create_sessions(user_id, [session_data])[0]
+
+    def create_sessions(
+        self, user_id: int, sessions_data: List[ChatSessionCreate]
+    ) -> List[ChatSession]:
+        """Create several chat sessions owned by a user in one transaction."""
+        db_sessions = [
+            ChatSession(
+                title=session_data.title,
+                description=session_data.description,
+                user_id=user_id,
+                session_type=session_data.session_type,
+                max_participants=session_data.max_participants,
+                participant_count=1,  # The owner
+            )
+            for session_data in sessions_data
+        ]
 
-        self.db.add(db_session)
-        self.db.flush()  # Get the session ID
+        self.db.add_all(db_sessions)
+        self.db.flush()  # Get the session IDs
+        session_ids = [db_session.id for db_session in db_sessions]
 
         # Add the owner as a participant with owner role
-        owner_participant = ChatParticipant(
-            session_id=db_session.id, user_id=user_id, role=ParticipantRole.OWNER
+        self.db.add_all(
+            ChatParticipant(
+                session_id=db_session.id, user_id=user_id, role=ParticipantRole.OWNER
+            )
+            for db_session in db_sessions
         )
-        self.db.add(owner_participant)
 
         self.db.commit()
-        self.db.refresh(db_session)
-        return db_session
+        self._reload(ChatSession, session_ids)
+        return db_sessions
+
+    def _reload(self, model, ids: List[int]) -> None:
+        """Reload rows expired by a commit with one IN query, not one per row."""
+        self.db.query(model).filter(model.id.in_(ids)).all()
+
+    def _adjust_counters(
+        self, session_id: int, participants: int = 0, messages: int = 0
+    ) -> None:
+        """Atomically adjust the denormalized counters of a session."""
+        values = {
+            # Counter bumps are not session edits; keep onupdate from firing
+            ChatSession.updated_at: ChatSession.updated_at,
+        }
+        if participants:
+            values[ChatSession.participant_count] = (
+                ChatSession.participant_count + participants
+            )
+        if messages:
+            values[ChatSession.message_count] = ChatSession.message_count + messages
+        self.db.query(ChatSession).filter(ChatSession.id == session_id).update(
+            values, synchronize_session=False
+        )
 
     def get_user_sessions(
         self, user_id: int, skip: int = 0, limit: int = 100
@@ -64,38 +107,50 @@ class ChatService:
     def get_public_sessions(
         self, user_id: int, skip: int = 0, limit: int = 100
     ) -> Tuple[List[ChatSession], int]:
-        """Get public chat sessions that user can join."""
-        # Get sessions where user is not already a participant
-        subquery = (
-            self.db.query(ChatParticipant.session_id)
-            .filter(
-                ChatParticipant.user_id == user_id, ChatParticipant.is_active == True
-            )
-            .subquery()
-        )
-
-        sessions = (
-            self.db.query(ChatSession)
-            .filter(
+        """Get public chat sessions that user can join.
+
+        The total comes from a window count on the same query, so the filter
+        and anti-join run once per page instead of once more for a COUNT.
+        """
+        # Sessions where user is not already a participant; NOT EXISTS lets the
+        # planner probe the active-participant index per session
+        stmt = lambda_stmt(
+            lambda: select(ChatSession, func.count().over().label("total"))
+            .options(joinedload(ChatSession.owner))
+            .where(
                 ChatSession.session_type == SessionType.PUBLIC,
                 ChatSession.is_active == True,
-                ~ChatSession.id.in_(subquery),
+                ~select(ChatParticipant.id)
+                .where(
+                    ChatParticipant.session_id == ChatSession.id,
+                    ChatParticipant.user_id == user_id,
+                    ChatParticipant.is_active == True,
+                )
+                .exists(),
             )
             .order_by(desc(ChatSession.created_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
-
-        total = (
-            self.db.query(ChatSession)
-            .filter(
+        stmt += lambda s: s.offset(skip).limit(limit)
+        rows = self.db.execute(stmt).all()
+        sessions = [row[0] for row in rows]
+        if rows or not skip:
+            return sessions, rows[0].total if rows else 0
+
+        # Paged past the end, so no row carried the total; count separately
+        total_stmt = lambda_stmt(
+            lambda: select(func.count(ChatSession.id)).where(
                 ChatSession.session_type == SessionType.PUBLIC,
                 ChatSession.is_active == True,
-                ~ChatSession.id.in_(subquery),
+                ~select(ChatParticipant.id)
+                .where(
+                    ChatParticipant.session_id == ChatSession.id,
+                    ChatParticipant.user_id == user_id,
+                    ChatParticipant.is_active == True,
+                )
+                .exists(),
             )
-            .count()
         )
+        total = self.db.execute(total_stmt).scalar_one()
 
         return sessions, total
 
@@ -116,13 +171,19 @@ class ChatService:
     def get_session_with_details(
         self, session_id: int, user_id: int
     ) -> Optional[ChatSession]:
-        """Get a chat session with all details (participants and messages)."""
+        """Get a chat session with its owner and active participants loaded.
+
+        Messages are not loaded here; use get_recent_messages for a bounded page.
+        Other relationships raise instead of lazy loading.
+        """
         return (
             self.db.query(ChatSession)
             .options(
-                joinedload(ChatSession.participants).joinedload(ChatParticipant.user),
-                joinedload(ChatSession.messages).joinedload(ChatMessage.user),
                 joinedload(ChatSession.owner),
+                selectinload(ChatSession.active_participants).selectinload(
+                    ChatParticipant.user
+                ),
+                raiseload("*"),
             )
             .join(ChatParticipant)
             .filter(
@@ -134,43 +195,69 @@ class ChatService:
             .first()
         )
 
-    def update_session(
-        self, session_id: int, user_id: int, session_data: ChatSessionUpdate
-    ) -> Optional[ChatSession]:
-        """Update a chat session (only owner or admin can update)."""
-        # Check if user has permission to update
-        participant = (
+    def get_recent_messages(self, session_id: int, limit: int) -> List[ChatMessage]:
+        """Get the latest messages of a session in chronological order.
+
+        Does not check access; callers must have verified the user already.
+        """
+        messages = (
+            self.db.query(ChatMessage)
+            .options(selectinload(ChatMessage.user))
+            .filter(ChatMessage.session_id == session_id)
+            .order_by(desc(ChatMessage.created_at), desc(ChatMessage.id))
+            .limit(limit)
+            .all()
+        )
+        messages.reverse()
+        return messages
+
+    def get_session_participants(
+        self, session_id: int, user_id: int
+    ) -> Optional[List[ChatParticipant]]:
+        """Get active participants of a session the user has access to."""
+        if not self.get_session_by_id(session_id, user_id):
+            return None
+
+        return (
             self.db.query(ChatParticipant)
+            .options(joinedload(ChatParticipant.user))
             .filter(
                 ChatParticipant.session_id == session_id,
+                ChatParticipant.is_active == True,
+            )
+            .order_by(ChatParticipant.joined_at)
+            .all()
+        )
+
+    def update_session(
+        self, session_id: int, user_id: int, session_data: ChatSessionUpdate
+    ) -> bool:
+        """Update a chat session (only owner or admin can update).
+
+        Returns whether the session exists and the user may manage it.
+        """
+        # The permission check is part of the WHERE clause, so a single UPDATE
+        # both authorizes and applies the change without loading the session
+        session = self.db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            ChatSession.is_active == True,
+            exists().where(
+                ChatParticipant.session_id == ChatSession.id,
                 ChatParticipant.user_id == user_id,
                 ChatParticipant.is_active == True,
                 ChatParticipant.role.in_(
                     [ParticipantRole.OWNER, ParticipantRole.ADMIN]
                 ),
-            )
-            .first()
+            ),
         )
 
-        if not participant:
-            return None
-
-        session = (
-            self.db.query(ChatSession)
-            .filter(ChatSession.id == session_id, ChatSession.is_active == True)
-            .first()
-        )
-
-        if not session:
-            return None
-
-        update_data = session_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(session, field, value)
+        update_data = session_data.model_dump(exclude_unset=True)
+        if not update_data:
+            return self.db.query(session.exists()).scalar()
 
+        updated = session.update(update_data, synchronize_session=False)
         self.db.commit()
-        self.db.refresh(session)
-        return session
+        return updated > 0
 
     def delete_session(self, session_id: int, user_id: int) -> bool:
         """Soft delete a chat session (only owner can delete)."""
@@ -193,58 +280,40 @@ class ChatService:
 
     def join_session(self, session_id: int, user_id: int) -> Optional[ChatParticipant]:
         """Join a public chat session."""
-        session = (
-            self.db.query(ChatSession)
+        # Fetch the session and any existing membership row together
+        row = (
+            self.db.query(ChatSession, ChatParticipant)
+            .outerjoin(
+                ChatParticipant,
+                and_(
+                    ChatParticipant.session_id == ChatSession.id,
+                    ChatParticipant.user_id == user_id,
+                ),
+            )
             .filter(
                 ChatSession.id == session_id,
                 ChatSession.is_active == True,
                 ChatSession.session_type.in_([SessionType.PUBLIC]),
             )
+            # Lock the session row so concurrent joins can't overfill it
+            .with_for_update(of=ChatSession)
             .first()
         )
 
-        if not session:
+        if not row:
             return None
+        session, existing_participant = row
 
-        # Check if user is already a participant
-        existing_participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == user_id,
-            )
-            .first()
-        )
-
-        if existing_participant:
-            if not existing_participant.is_active:
-                existing_participant.is_active = True
-                self.db.commit()
-                return existing_participant
+        if existing_participant and existing_participant.is_active:
             return existing_participant
 
-        # Check participant limit
-        current_participants = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.is_active == True,
-            )
-            .count()
-        )
-
-        if current_participants >= session.max_participants:
+        # Check participant limit; the count is a column, not a COUNT(*), and
+        # the row lock above holds it steady until this transaction commits
+        if session.participant_count >= session.max_participants:
             return None
 
-        # Add new participant
-        participant = ChatParticipant(
-            session_id=session_id, user_id=user_id, role=ParticipantRole.MEMBER
-        )
-
-        self.db.add(participant)
-        self.db.commit()
-        self.db.refresh(participant)
-        return participant
+        # Add new participant, or reactivate them with their previous role
+        return self._activate_participant(session_id, user_id, ParticipantRole.MEMBER)
 
     def leave_session(self, session_id: int, user_id: int) -> bool:
         """Leave a chat session."""
@@ -266,6 +335,7 @@ class ChatService:
             return False
 
         participant.is_active = False
+        self._adjust_counters(session_id, participants=-1)
         self.db.commit()
         return True
 
@@ -273,84 +343,122 @@ class ChatService:
         self, session_id: int, inviter_id: int, invite_data: InviteUserRequest
     ) -> Optional[ChatParticipant]:
         """Invite a user to a chat session (owner/admin only)."""
-        # Check if inviter has permission
-        inviter_participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == inviter_id,
-                ChatParticipant.is_active == True,
-                ChatParticipant.role.in_(
-                    [ParticipantRole.OWNER, ParticipantRole.ADMIN]
+        inviter = aliased(ChatParticipant)
+        existing = aliased(ChatParticipant)
+        # One query checks the inviter's permission and that the invitee exists,
+        # and fetches the session with any existing membership of the invitee
+        row = (
+            self.db.query(ChatSession, existing)
+            .join(
+                inviter,
+                and_(
+                    inviter.session_id == ChatSession.id,
+                    inviter.user_id == inviter_id,
+                    inviter.is_active == True,
+                    inviter.role.in_([ParticipantRole.OWNER, ParticipantRole.ADMIN]),
+                ),
+            )
+            .join(User, and_(User.id == invite_data.user_id, User.is_active == True))
+            .outerjoin(
+                existing,
+                and_(
+                    existing.session_id == ChatSession.id,
+                    existing.user_id == invite_data.user_id,
                 ),
             )
-            .first()
-        )
-
-        if not inviter_participant:
-            return None
-
-        # Check if session exists and is active
-        session = (
-            self.db.query(ChatSession)
             .filter(ChatSession.id == session_id, ChatSession.is_active == True)
+            # Lock the session row so concurrent invites can't overfill it
+            .with_for_update(of=ChatSession)
             .first()
         )
 
-        if not session:
+        if not row:
             return None
+        session, existing_participant = row
 
-        # Check if user exists
-        user_exists = (
-            self.db.query(User)
-            .filter(User.id == invite_data.user_id, User.is_active == True)
-            .first()
-        )
+        if existing_participant and existing_participant.is_active:
+            return existing_participant
 
-        if not user_exists:
+        # Check participant limit; the count is a column, not a COUNT(*), and
+        # the row lock above holds it steady until this transaction commits
+        if session.participant_count >= session.max_participants:
             return None
 
-        # Check if user is already a participant
-        existing_participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == invite_data.user_id,
-            )
-            .first()
-        )
-
-        if existing_participant:
-            if not existing_participant.is_active:
-                existing_participant.is_active = True
-                existing_participant.role = invite_data.role
-                self.db.commit()
-                return existing_participant
-            return existing_participant
-
-        # Check participant limit
-        current_participants = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.is_active == True,
-            )
-            .count()
+        # Add new participant, or reactivate them with the invited role
+        return self._activate_participant(
+            session_id, invite_data.user_id, invite_data.role, set_role=True
         )
 
-        if current_participants >= session.max_participants:
-            return None
-
-        # Add new participant
-        participant = ChatParticipant(
-            session_id=session_id, user_id=invite_data.user_id, role=invite_data.role
+    def _activate_participant(
+        self,
+        session_id: int,
+        user_id: int,
+        role: ParticipantRole,
+        set_role: bool = False,
+    ) -> ChatParticipant:
+        """Insert a participant or reactivate their inactive row in one statement.
+
+        Uses INSERT ... ON CONFLICT (session_id, user_id) DO UPDATE, so a
+        concurrent join of the same user can't fail on the unique constraint.
+        The counters move only when a row was actually inserted or reactivated.
+        """
+        insert = UPSERT_INSERTS[self.db.get_bind().dialect.name]
+        stmt = insert(ChatParticipant).values(
+            session_id=session_id, user_id=user_id, role=role
         )
+        set_ = {"is_active": True}
+        if set_role:
+            set_["role"] = stmt.excluded.role
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["session_id", "user_id"],
+            set_=set_,
+            where=ChatParticipant.is_active == False,
+        ).returning(ChatParticipant)
+
+        participant = self.db.scalars(
+            stmt, execution_options={"populate_existing": True}
+        ).one_or_none()
+        if participant is None:
+            # Already active, activated by a concurrent request
+            participant = (
+                self.db.query(ChatParticipant)
+                .filter(
+                    ChatParticipant.session_id == session_id,
+                    ChatParticipant.user_id == user_id,
+                )
+                .one()
+            )
+        else:
+            self._adjust_counters(session_id, participants=1)
 
-        self.db.add(participant)
         self.db.commit()
         self.db.refresh(participant)
         return participant
 
+    def _get_admin_and_target(
+        self, session_id: int, admin_id: int, participant_user_id: int
+    ) -> Tuple[Optional[ChatParticipant], Optional[ChatParticipant]]:
+        """Fetch an acting owner/admin and a target participant in one query.
+
+        Either side is None when missing, inactive or, for the admin, lacking
+        the owner or admin role.
+        """
+        participants = {
+            participant.user_id: participant
+            for participant in self.db.query(ChatParticipant).filter(
+                ChatParticipant.session_id == session_id,
+                ChatParticipant.user_id.in_([admin_id, participant_user_id]),
+                ChatParticipant.is_active == True,
+            )
+        }
+        admin_participant = participants.get(admin_id)
+        if admin_participant and admin_participant.role not in (
+            ParticipantRole.OWNER,
+            ParticipantRole.ADMIN,
+        ):
+            admin_participant = None
+        return admin_participant, participants.get(participant_user_id)
+
     def update_participant_role(
         self,
         session_id: int,
@@ -359,35 +467,10 @@ class ChatService:
         role_data: UpdateParticipantRoleRequest,
     ) -> Optional[ChatParticipant]:
         """Update a participant's role (owner/admin only)."""
-        # Check if admin has permission
-        admin_participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == admin_id,
-                ChatParticipant.is_active == True,
-                ChatParticipant.role.in_(
-                    [ParticipantRole.OWNER, ParticipantRole.ADMIN]
-                ),
-            )
-            .first()
-        )
-
-        if not admin_participant:
-            return None
-
-        # Get the participant to update
-        participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == participant_user_id,
-                ChatParticipant.is_active == True,
-            )
-            .first()
+        admin_participant, participant = self._get_admin_and_target(
+            session_id, admin_id, participant_user_id
         )
-
-        if not participant:
+        if not admin_participant or not participant:
             return None
 
         # Cannot change owner role or make someone owner (unless admin is owner)
@@ -407,35 +490,10 @@ class ChatService:
         self, session_id: int, admin_id: int, participant_user_id: int
     ) -> bool:
         """Remove a participant from session (owner/admin only)."""
-        # Check if admin has permission
-        admin_participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == admin_id,
-                ChatParticipant.is_active == True,
-                ChatParticipant.role.in_(
-                    [ParticipantRole.OWNER, ParticipantRole.ADMIN]
-                ),
-            )
-            .first()
+        admin_participant, participant = self._get_admin_and_target(
+            session_id, admin_id, participant_user_id
         )
-
-        if not admin_participant:
-            return False
-
-        # Get the participant to remove
-        participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == participant_user_id,
-                ChatParticipant.is_active == True,
-            )
-            .first()
-        )
-
-        if not participant:
+        if not admin_participant or not participant:
             return False
 
         # Cannot remove owner
@@ -443,17 +501,15 @@ class ChatService:
             return False
 
         participant.is_active = False
+        self._adjust_counters(session_id, participants=-1)
         self.db.commit()
         return True
 
-    def add_message(
-        self, session_id: int, user_id: int, message_data: ChatMessageCreate
-    ) -> Optional[ChatMessage]:
-        """Add a message to a chat session."""
-        # Check if user is a participant with message permissions
-        participant = (
-            self.db.query(ChatParticipant)
-            .filter(
+    def can_post(self, session_id: int, user_id: int) -> bool:
+        """Check if user is a participant with message permissions."""
+        # EXISTS returns a single boolean instead of hydrating the participant
+        return self.db.query(
+            exists().where(
                 ChatParticipant.session_id == session_id,
                 ChatParticipant.user_id == user_id,
                 ChatParticipant.is_active == True,
@@ -465,88 +521,119 @@ class ChatService:
                     ]
                 ),
             )
-            .first()
-        )
+        ).scalar()
 
-        if not participant:
+    def add_message(
+        self, session_id: int, user_id: int, message_data: ChatMessageCreate
+    ) -> Optional[ChatMessage]:
+        """Add a message to a chat session."""
+        if not self.can_post(session_id, user_id):
             return None
 
-        db_message = ChatMessage(
-            session_id=session_id,
-            user_id=user_id,
-            role=message_data.role,
-            content=message_data.content,
-        )
+        return self.add_messages(session_id, user_id, [message_data])[0]
 
-        self.db.add(db_message)
+    def add_messages(
+        self, session_id: int, user_id: int, messages: List[ChatMessageCreate]
+    ) -> List[ChatMessage]:
+        """Add several messages to a chat session in one transaction.
+
+        Does not check access; callers must have verified the user already.
+        """
+        db_messages = [
+            ChatMessage(
+                session_id=session_id,
+                user_id=user_id,
+                role=message_data.role,
+                content=message_data.content,
+            )
+            for message_data in messages
+        ]
+
+        self.db.add_all(db_messages)
+        self.db.flush()  # Get the message IDs
+        message_ids = [db_message.id for db_message in db_messages]
+        self._adjust_counters(session_id, messages=len(db_messages))
         self.db.commit()
-        self.db.refresh(db_message)
-        return db_message
+        self._reload(ChatMessage, message_ids)
+        return db_messages
 
     def get_session_messages(
-        self, session_id: int, user_id: int, skip: int = 0, limit: int = 100
+        self,
+        session_id: int,
+        user_id: int,
+        before_created_at: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+        limit: int = 100,
+        check_access: bool = True,
     ) -> List[ChatMessage]:
-        """Get messages for a chat session."""
-        # Check if user is a participant
-        participant = (
-            self.db.query(ChatParticipant)
-            .filter(
-                ChatParticipant.session_id == session_id,
-                ChatParticipant.user_id == user_id,
-                ChatParticipant.is_active == True,
+        """Get the messages preceding a (created_at, id) cursor, oldest first."""
+        if check_access:
+            # Check if user is a participant
+            participant = (
+                self.db.query(ChatParticipant)
+                .filter(
+                    ChatParticipant.session_id == session_id,
+                    ChatParticipant.user_id == user_id,
+                    ChatParticipant.is_active == True,
+                )
+                .first()
             )
-            .first()
-        )
 
-        if not participant:
-            return []
+            if not participant:
+                return []
 
-        return (
-            self.db.query(ChatMessage)
-            .options(joinedload(ChatMessage.user))
-            .filter(ChatMessage.session_id == session_id)
-            .order_by(ChatMessage.created_at)
-            .offset(skip)
-            .limit(limit)
-            .all()
+        stmt = lambda_stmt(
+            lambda: select(ChatMessage)
+            .options(selectinload(ChatMessage.user), raiseload("*"))
+            .where(ChatMessage.session_id == session_id)
         )
+        if before_created_at is not None and before_id is not None:
+            # Keyset seek on (session_id, created_at) instead of OFFSET scans
+            stmt += lambda s: s.where(
+                tuple_(ChatMessage.created_at, ChatMessage.id)
+                < tuple_(before_created_at, before_id)
+            )
+        stmt += lambda s: s.order_by(
+            desc(ChatMessage.created_at), desc(ChatMessage.id)
+        ).limit(limit)
 
-    def get_user_sessions_with_counts(
-        self, user_id: int, skip: int = 0, limit: int = 100
-    ):
-        """Get user sessions with message and participant counts."""
-        # Create an alias for the participant table to avoid conflicts
-        from sqlalchemy.orm import aliased
+        messages = self.db.execute(stmt).scalars().all()
+        messages.reverse()
+        return messages
 
-        participant_alias = aliased(ChatParticipant)
+    def get_user_sessions_with_counts(
+        self,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        before_updated_at: Optional[datetime] = None,
+        before_id: Optional[int] = None,
+    ) -> List[ChatSession]:
+        """Get user sessions, most recently updated first.
 
-        return (
-            self.db.query(
-                ChatSession,
-                func.count(ChatMessage.id.distinct()).label("message_count"),
-                func.count(ChatParticipant.id.distinct()).label("participant_count"),
-            )
-            .outerjoin(ChatMessage, ChatSession.id == ChatMessage.session_id)
-            .outerjoin(
-                ChatParticipant,
-                and_(
-                    ChatSession.id == ChatParticipant.session_id,
-                    ChatParticipant.is_active == True,
-                ),
-            )
-            .join(
-                participant_alias,
-                and_(  # Join for user's participation
-                    ChatSession.id == participant_alias.session_id,
-                    participant_alias.user_id == user_id,
-                    participant_alias.is_active == True,
-                ),
+        Counts come from the denormalized columns. Pass the (updated_at, id) of
+        the last session of a page to seek to the next one instead of skipping.
+        """
+        stmt = lambda_stmt(
+            lambda: select(ChatSession)
+            .join(ChatParticipant)
+            .options(joinedload(ChatSession.owner), raiseload("*"))
+            .where(
+                ChatParticipant.user_id == user_id,
+                ChatParticipant.is_active == True,
+                ChatSession.is_active == True,
             )
-            .options(joinedload(ChatSession.owner))
-            .filter(ChatSession.is_active == True)
-            .group_by(ChatSession.id)
-            .order_by(desc(ChatSession.updated_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
+        if before_updated_at is not None and before_id is not None:
+            stmt += lambda s: s.where(
+                tuple_(ChatSession.updated_at, ChatSession.id)
+                < tuple_(before_updated_at, before_id)
+            )
+        stmt += lambda s: s.order_by(desc(ChatSession.updated_at), desc(ChatSession.id))
+        stmt += lambda s: s.offset(skip).limit(limit)
+        return self.db.execute(stmt).scalars().all()
+
+
+def get_chat_service(db: Session = Depends(get_db)) -> ChatService:
+    """Request-scoped ChatService dependency."""
+    return ChatService(db)
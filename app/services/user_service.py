@@ -1,19 +1,58 @@
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import logging
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, or_
+from app.core.database import SessionLocal, get_db
+from app.core.redis import redis_manager
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
 
+# Redis bitset bloom filters over every email and username ever registered. A
+# negative lookup proves a value is free without querying the database. The
+# filters are only trusted once USER_BLOOM_READY_KEY exists (after a full seed).
+USER_BLOOM_KEY = "users:bloom:{field}"
+USER_BLOOM_READY_KEY = "users:bloom:ready"
+USER_BLOOM_SEED_LOCK_KEY = "users:bloom:seeding"
+USER_BLOOM_BITS = 1 << 24  # 2 MiB per field; ~1% false positives at 1.7M users
+USER_BLOOM_HASHES = 7
+USER_BLOOM_SEED_PAGE_SIZE = 5000
+
+log = logging.getLogger("insurge.users")
+
+_bloom_reseed_task: Optional[asyncio.Task] = None
+
+
+def _bloom_offsets(value: str) -> List[int]:
+    """Bit offsets of value, by double hashing one blake2b digest."""
+    digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:], "big") | 1
+    return [(h1 + i * h2) % USER_BLOOM_BITS for i in range(USER_BLOOM_HASHES)]
+
+
+def _bloom_setbits(email: str, username: str) -> Iterator[Tuple]:
+    for field, value in (("email", email), ("username", username)):
+        key = USER_BLOOM_KEY.format(field=field)
+        for offset in _bloom_offsets(value):
+            yield ("setbit", (key, offset, 1))
+
 
 class UserService:
     def __init__(self, db: Session):
         self.db = db
 
-    def create_user(self, user_data: UserCreate) -> User:
-        """Create a new user."""
+    def create_user(
+        self, user_data: UserCreate, hashed_password: Optional[str] = None
+    ) -> User:
+        """Create a new user, hashing the password unless a hash is given."""
         # Hash the password
-        hashed_password = get_password_hash(user_data.password)
+        if hashed_password is None:
+            hashed_password = get_password_hash(user_data.password)
 
         # Create user instance
         db_user = User(
@@ -42,6 +81,14 @@ class UserService:
         """Get user by username."""
         return self.db.query(User).filter(User.username == username).first()
 
+    def get_token_state(self, user_id: int):
+        """Get (email, is_active, token_version) for a user, or None."""
+        return (
+            self.db.query(User.email, User.is_active, User.token_version)
+            .filter(User.id == user_id)
+            .first()
+        )
+
     def authenticate_user(self, email: str, password: str) -> Optional[User]:
         """Authenticate user with email and password."""
         user = self.get_user_by_email(email)
@@ -53,18 +100,19 @@ class UserService:
 
     def update_user(self, user_id: int, user_data: UserUpdate) -> Optional[User]:
         """Update user information."""
-        user = self.get_user_by_id(user_id)
-        if not user:
-            return None
-
-        # Update only provided fields
-        update_data = user_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(user, field, value)
+        # Update only provided fields, in one UPDATE without loading the user
+        update_data = user_data.model_dump(exclude_unset=True)
+        if update_data:
+            updated = (
+                self.db.query(User)
+                .filter(User.id == user_id)
+                .update(update_data, synchronize_session=False)
+            )
+            self.db.commit()
+            if not updated:
+                return None
 
-        self.db.commit()
-        self.db.refresh(user)
-        return user
+        return self.get_user_by_id(user_id)
 
     def deactivate_user(self, user_id: int) -> bool:
         """Deactivate a user."""
@@ -73,21 +121,142 @@ class UserService:
             return False
 
         user.is_active = False
+        user.token_version = User.token_version + 1
         self.db.commit()
         return True
 
     def is_email_taken(self, email: str, exclude_user_id: Optional[int] = None) -> bool:
         """Check if email is already taken."""
-        query = self.db.query(User).filter(User.email == email)
+        query = self.db.query(User.id).filter(User.email == email)
         if exclude_user_id:
             query = query.filter(User.id != exclude_user_id)
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
 
     def is_username_taken(
         self, username: str, exclude_user_id: Optional[int] = None
     ) -> bool:
         """Check if username is already taken."""
-        query = self.db.query(User).filter(User.username == username)
+        query = self.db.query(User.id).filter(User.username == username)
         if exclude_user_id:
             query = query.filter(User.id != exclude_user_id)
-        return query.first() is not None
+        return self.db.query(query.exists()).scalar()
+
+    async def maybe_taken(self, values: Dict[str, str]) -> Set[str]:
+        """Return the fields ("email"/"username") whose value may be in use.
+
+        Fields left out are definitely free. Until the filters are seeded, or
+        when Redis is unavailable, every field is returned.
+        """
+        fields = list(values)
+        commands = [("exists", (USER_BLOOM_READY_KEY,))]
+        for field in fields:
+            key = USER_BLOOM_KEY.format(field=field)
+            commands.extend(
+                ("getbit", (key, offset)) for offset in _bloom_offsets(values[field])
+            )
+
+        try:
+            # Readiness and every bit of every field in one round trip
+            results = await redis_manager.batch_exec(commands)
+        except Exception:
+            return set(fields)
+        if not results[0]:
+            return set(fields)
+
+        taken = set()
+        for index, field in enumerate(fields):
+            start = 1 + index * USER_BLOOM_HASHES
+            if all(results[start : start + USER_BLOOM_HASHES]):
+                taken.add(field)
+        return taken
+
+    async def add_to_bloom(self, email: str, username: str) -> None:
+        """Record a user's email and username in the bloom filters."""
+        try:
+            await redis_manager.batch_exec(_bloom_setbits(email, username))
+        except Exception as e:
+            # A missed insert would turn into a false negative; distrust the
+            # filters until they are reseeded
+            log.warning("User bloom filter insert failed, reseeding: %s", e)
+            try:
+                await redis_manager.delete(USER_BLOOM_READY_KEY)
+            except Exception as e:
+                log.warning("Failed to mark the user bloom filters stale: %s", e)
+            _schedule_bloom_reseed()
+
+    async def seed_bloom(self) -> None:
+        """Fill the bloom filters from the users table unless already seeded."""
+        if await redis_manager.exists(USER_BLOOM_READY_KEY):
+            return
+        # One worker seeds; the others keep using the database meanwhile
+        if not await redis_manager.redis_client.set(
+            USER_BLOOM_SEED_LOCK_KEY, "1", nx=True, ex=300
+        ):
+            return
+
+        try:
+            last_id = 0
+            while True:
+                rows = await run_in_threadpool(
+                    self._get_user_keys_page, last_id, USER_BLOOM_SEED_PAGE_SIZE
+                )
+                if not rows:
+                    break
+                await redis_manager.batch_exec(
+                    command
+                    for row in rows
+                    for command in _bloom_setbits(row.email, row.username)
+                )
+                last_id = rows[-1].id
+            await redis_manager.set(USER_BLOOM_READY_KEY, "1")
+        finally:
+            await redis_manager.delete(USER_BLOOM_SEED_LOCK_KEY)
+
+    def _get_user_keys_page(self, after_id: int, limit: int):
+        return (
+            self.db.query(User.id, User.email, User.username)
+            .filter(User.id > after_id)
+            .order_by(User.id)
+            .limit(limit)
+            .all()
+        )
+
+    def find_registration_conflicts(self, email: str, username: str) -> Set[str]:
+        """Return which of "email"/"username" are already taken, in one query."""
+        rows = (
+            self.db.query(User.email, User.username)
+            .filter(or_(User.email == email, User.username == username))
+            .limit(2)
+            .all()
+        )
+
+        conflicts = set()
+        for existing_email, existing_username in rows:
+            if existing_email == email:
+                conflicts.add("email")
+            if existing_username == username:
+                conflicts.add("username")
+        return conflicts
+
+
+async def seed_user_bloom():
+    """Seed the email/username bloom filters on a session of its own."""
+    db = SessionLocal()
+    try:
+        await UserService(db).seed_bloom()
+    except Exception as e:
+        log.warning("User bloom filter seeding failed: %s", e)
+    finally:
+        db.close()
+
+
+def _schedule_bloom_reseed():
+    # seed_bloom holds a Redis lock, so at most one worker reseeds at a time
+    global _bloom_reseed_task
+    if _bloom_reseed_task is None or _bloom_reseed_task.done():
+        _bloom_reseed_task = asyncio.create_task(seed_user_bloom())
+
+
+def get_user_service(db: Session = Depends(get_db)) -> UserService:
+    """Request-scoped UserService dependency."""
+    return UserService(db)
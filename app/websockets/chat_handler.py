@@ -1,16 +1,94 @@
-from fastapi import WebSocket, Depends, HTTPException, status, Query
+from fastapi import (
+    WebSocket,
+    WebSocketDisconnect,
+    Depends,
+    HTTPException,
+    status,
+    Query,
+)
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.api.dependencies import load_user
 from app.core.security import verify_token
 from app.services.user_service import UserService
 from app.services.chat_service import ChatService
 from app.websockets.connection_manager import manager
 from app.models.chat_message import MessageRole
-from app.schemas.chat import ChatMessageCreate, WebSocketMessage
-import json
-import asyncio
+from app.schemas.chat import ChatMessageCreate
+import logging
+import orjson
+import random
+from collections import deque
+from functools import partial
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+log = logging.getLogger("insurge.websockets")
+
+# Messages of context handed to the AI for each reply
+HISTORY_LENGTH = 10
+
+# Replies used when the AI service fails
+FALLBACK_RESPONSES = (
+    "I understand you said: '{message}'. How can I help you further?",
+    "That's interesting! Regarding '{message}', let me think about that...",
+    "Thank you for sharing: '{message}'. What would you like to know?",
+    "I'm here to help! Could you provide more details about what you're looking for?",
+    "That's a great question! Let me provide you with some information on that topic.",
+)
+
+
+# Outgoing frames have the shape of schemas.chat.WebSocketMessage. The server
+# builds them itself, so they are encoded directly without a Pydantic model.
+def _frame(
+    frame_type: str,
+    content: str,
+    session_id: Optional[int] = None,
+    timestamp: Optional[datetime] = None,
+) -> bytes:
+    """Encode an outgoing frame with orjson (datetimes are handled natively)."""
+    return orjson.dumps(
+        {
+            "type": frame_type,
+            "content": content,
+            "session_id": session_id,
+            "timestamp": timestamp or datetime.utcnow(),
+        }
+    )
+
+
+def _static_frame(frame_type: str, content: str) -> bytes:
+    """Pre-encode a fixed frame, leaving a %s slot for its timestamp."""
+    return orjson.dumps(
+        {
+            "type": frame_type,
+            "content": content,
+            "session_id": None,
+            "timestamp": "%s",
+        }
+    )
+
+
+_PONG_FRAME = _static_frame("pong", "pong")
+_INVALID_JSON_FRAME = _static_frame("error", "Invalid JSON format")
+_INVALID_FORMAT_FRAME = _static_frame("error", "Invalid message format")
+_ACCESS_DENIED_FRAME = _static_frame("error", "Session not found or access denied")
+
+
+def _stamp(template: bytes) -> bytes:
+    """Fill the timestamp slot of a pre-encoded frame with the current time."""
+    return template % datetime.utcnow().isoformat().encode()
+
+
+async def _receive_frame(websocket: WebSocket):
+    """Receive the payload of the next text or binary frame."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is not None:
+        return message["text"]
+    return message.get("bytes")
 
 
 async def get_user_from_token(token: str, db: Session):
@@ -24,8 +102,7 @@ async def get_user_from_token(token: str, db: Session):
         if not user_id:
             return None
 
-        user_service = UserService(db)
-        user = user_service.get_user_by_id(user_id)
+        user = await load_user(UserService(db), user_id)
 
         if not user or not user.is_active:
             return None
@@ -40,182 +117,191 @@ async def websocket_endpoint(
     token: str = Query(...),
     session_id: Optional[int] = Query(None),
     db: Session = Depends(get_db),
+    binary: bool = Query(False),
 ):
-    """WebSocket endpoint for chat functionality."""
+    """WebSocket endpoint for chat functionality.
+
+    Frames are JSON text unless the client connects with binary=true, in which
+    case the same JSON is sent as binary frames without a text decode.
+    """
     # Authenticate user
     user = await get_user_from_token(token, db)
     if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
+    # ChatService is synchronous; every call on it below runs in the threadpool
+    # so a slow query never stalls the event loop and the other sockets on it
+    chat_service = ChatService(db)
+
     # Validate session if provided
     if session_id:
-        chat_service = ChatService(db)
-        session = chat_service.get_session_by_id(session_id, user.id)
+        session = await run_in_threadpool(
+            chat_service.get_session_by_id, session_id, user.id
+        )
         if not session:
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
     # Connect to WebSocket
-    await manager.connect(websocket, user.id, session_id)
+    await manager.connect(websocket, user.id, session_id, binary=binary)
+    # Sessions this socket has verified posting rights for; later messages to
+    # them skip the membership query. Access changes apply on reconnect.
+    websocket.state.user = user
+    websocket.state.sessions = set()
+    # Recent messages per session, fed to the AI without re-reading the database
+    websocket.state.history = {}
 
     try:
         # Send welcome message
-        welcome_message = WebSocketMessage(
-            type="system_message",
-            content=f"Connected to chat{'session ' + str(session_id) if session_id else ''}",
-            session_id=session_id,
-            timestamp=datetime.utcnow(),
+        welcome_message = _frame(
+            "system_message",
+            f"Connected to chat{'session ' + str(session_id) if session_id else ''}",
+            session_id,
         )
-        await manager.send_personal_message(welcome_message.json(), websocket)
+        await manager.send_personal_message(welcome_message, websocket)
 
         while True:
             # Receive message from client
-            data = await websocket.receive_text()
+            data = await _receive_frame(websocket)
 
             try:
-                message_data = json.loads(data)
+                message_data = orjson.loads(data)
                 message_type = message_data.get("type", "chat_message")
                 content = message_data.get("content", "")
                 target_session_id = message_data.get("session_id", session_id)
 
                 if message_type == "chat_message" and content and target_session_id:
-                    # Validate session ownership
-                    chat_service = ChatService(db)
-                    session = chat_service.get_session_by_id(target_session_id, user.id)
-                    if not session:
-                        error_message = WebSocketMessage(
-                            type="error",
-                            content="Session not found or access denied",
-                            timestamp=datetime.utcnow(),
+                    if target_session_id not in websocket.state.sessions:
+                        # Validate the user may post to this session
+                        allowed = await run_in_threadpool(
+                            chat_service.can_post, target_session_id, user.id
                         )
-                        await manager.send_personal_message(
-                            error_message.json(), websocket
-                        )
-                        continue
+                        if not allowed:
+                            await manager.send_personal_message(
+                                _stamp(_ACCESS_DENIED_FRAME), websocket
+                            )
+                            continue
+                        websocket.state.sessions.add(target_session_id)
 
-                    # Save user message to database
-                    user_message = ChatMessageCreate(
-                        role=MessageRole.USER, content=content
+                    # Broadcast user message to session
+                    user_msg = _frame("chat_message", content, target_session_id)
+                    await manager.send_message_to_session(
+                        user_msg, user.id, target_session_id
                     )
-                    saved_message = chat_service.add_message(
-                        target_session_id, user.id, user_message
-                    )
-
-                    if saved_message:
-                        # Broadcast user message to session
-                        user_msg = WebSocketMessage(
-                            type="chat_message",
-                            content=content,
-                            session_id=target_session_id,
-                            timestamp=saved_message.created_at,
-                        )
-                        await manager.send_message_to_session(
-                            user_msg.json(), user.id, target_session_id
-                        )
 
-                        # Get conversation history for better AI responses
-                        messages = chat_service.get_session_messages(
-                            target_session_id, user.id, limit=10
+                    # Conversation history for better AI responses, kept on the
+                    # socket; the database is read only when it is cold
+                    history = websocket.state.history.get(target_session_id)
+                    if history is None:
+                        messages = await run_in_threadpool(
+                            chat_service.get_session_messages,
+                            target_session_id,
+                            user.id,
+                            limit=HISTORY_LENGTH,
+                            check_access=False,
                         )
-                        conversation_history = [
-                            {"role": msg.role.value.lower(), "content": msg.content}
-                            for msg in messages
-                        ]
-
-                        # Simulate AI response with conversation context
-                        ai_response = await generate_ai_response(
-                            content, conversation_history
+                        history = deque(
+                            (
+                                {"role": msg.role.value.lower(), "content": msg.content}
+                                for msg in messages
+                            ),
+                            maxlen=HISTORY_LENGTH,
                         )
+                        websocket.state.history[target_session_id] = history
+                    history.append({"role": MessageRole.USER.value, "content": content})
+
+                    # Forward the AI response as chat_chunk frames while it is
+                    # generated; chat_message below carries the complete reply
+                    chunks = []
+                    # Best effort: the final chat_message is the confirmed copy
+                    # and is only sent once these have gone out. Chunks arriving
+                    # close together share a frame.
+                    coalescer = manager.coalesce_chunks(
+                        partial(_frame, "chat_chunk", session_id=target_session_id),
+                        user.id,
+                        target_session_id,
+                    )
+                    async for chunk in stream_ai_response(content, list(history)):
+                        chunks.append(chunk)
+                        coalescer.add(chunk)
+                    coalescer.flush()
+                    ai_response = "".join(chunks)
+                    history.append(
+                        {"role": MessageRole.ASSISTANT.value, "content": ai_response}
+                    )
 
-                        # Save AI response to database
-                        ai_message = ChatMessageCreate(
-                            role=MessageRole.ASSISTANT, content=ai_response
-                        )
-                        saved_ai_message = chat_service.add_message(
-                            target_session_id, user.id, ai_message
-                        )
+                    # Save both messages of the turn in one transaction
+                    user_message = ChatMessageCreate(
+                        role=MessageRole.USER, content=content
+                    )
+                    ai_message = ChatMessageCreate(
+                        role=MessageRole.ASSISTANT, content=ai_response
+                    )
+                    _, saved_ai_message = await run_in_threadpool(
+                        chat_service.add_messages,
+                        target_session_id,
+                        user.id,
+                        [user_message, ai_message],
+                    )
 
-                        if saved_ai_message:
-                            # Send AI response
-                            ai_msg = WebSocketMessage(
-                                type="chat_message",
-                                content=ai_response,
-                                session_id=target_session_id,
-                                timestamp=saved_ai_message.created_at,
-                            )
-                            await manager.send_message_to_session(
-                                ai_msg.json(), user.id, target_session_id
-                            )
+                    # Send AI response
+                    ai_msg = _frame(
+                        "chat_message",
+                        ai_response,
+                        target_session_id,
+                        saved_ai_message.created_at,
+                    )
+                    await manager.send_message_to_session(
+                        ai_msg, user.id, target_session_id
+                    )
 
                 elif message_type == "ping":
                     # Respond to ping with pong
-                    pong_message = WebSocketMessage(
-                        type="pong", content="pong", timestamp=datetime.utcnow()
-                    )
-                    await manager.send_personal_message(pong_message.json(), websocket)
+                    await manager.send_personal_message(_stamp(_PONG_FRAME), websocket)
 
                 else:
                     # Invalid message format
-                    error_message = WebSocketMessage(
-                        type="error",
-                        content="Invalid message format",
-                        timestamp=datetime.utcnow(),
+                    await manager.send_personal_message(
+                        _stamp(_INVALID_FORMAT_FRAME), websocket
                     )
-                    await manager.send_personal_message(error_message.json(), websocket)
 
-            except json.JSONDecodeError:
-                error_message = WebSocketMessage(
-                    type="error",
-                    content="Invalid JSON format",
-                    timestamp=datetime.utcnow(),
+            except orjson.JSONDecodeError:
+                await manager.send_personal_message(
+                    _stamp(_INVALID_JSON_FRAME), websocket
                 )
-                await manager.send_personal_message(error_message.json(), websocket)
 
             except Exception as e:
-                error_message = WebSocketMessage(
-                    type="error",
-                    content=f"Server error: {str(e)}",
-                    timestamp=datetime.utcnow(),
-                )
-                await manager.send_personal_message(error_message.json(), websocket)
+                error_message = _frame("error", f"Server error: {str(e)}")
+                await manager.send_personal_message(error_message, websocket)
 
     except Exception as e:
-        print(f"WebSocket error for user {user.id}: {e}")
+        log.warning("WebSocket error for user %s: %s", user.id, e)
     finally:
-        await manager.disconnect(websocket, user.id, session_id)
+        await manager.disconnect(websocket)
 
 
-async def generate_ai_response(
+async def stream_ai_response(
     user_message: str, conversation_history: list = None
-) -> str:
+) -> AsyncIterator[str]:
     """
-    Generate AI response to user message.
+    Stream the AI response to a user message in chunks.
     This integrates with the AI service for better responses.
     """
+    sent_any = False
     try:
         from app.services.ai_service import ai_service
 
         # Prepare conversation history if available
         messages = conversation_history or []
 
-        # Generate response using AI service
-        response = await ai_service.generate_response(messages, user_message)
-        return response
+        # Stream response chunks from the AI service
+        async for chunk in ai_service.stream_response(messages, user_message):
+            sent_any = True
+            yield chunk
 
     except Exception as e:
-        print(f"AI service error: {e}")
-        # Fallback to simple responses
-        await asyncio.sleep(1)
-
-        responses = [
-            f"I understand you said: '{user_message}'. How can I help you further?",
-            f"That's interesting! Regarding '{user_message}', let me think about that...",
-            f"Thank you for sharing: '{user_message}'. What would you like to know?",
-            "I'm here to help! Could you provide more details about what you're looking for?",
-            "That's a great question! Let me provide you with some information on that topic.",
-        ]
-
-        import random
-
-        return random.choice(responses)
+        log.warning("AI service error: %s", e)
+        # Fall back to a simple response unless part of a reply already went out
+        if not sent_any:
+            yield random.choice(FALLBACK_RESPONSES).format(message=user_message)
@@ -1,103 +1,401 @@
-from typing import Dict, Set
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
 from fastapi import WebSocket
-import json
 import asyncio
-from datetime import datetime
+import logging
+import orjson
+from app.core.config import settings
+from app.core.redis import redis_manager
+
+log = logging.getLogger("insurge.websockets")
+
+# Redis pub/sub channels of the WebSocket bus: ws:user:{user_id} and
+# ws:session:{user_id}:{session_id}
+BUS_PREFIX = "ws:"
+
+# Payloads are encoded once, before fan-out, as UTF-8 JSON bytes
+_encode = orjson.dumps
+
+# An immutable snapshot of the sockets registered under one key
+Connections = Tuple[WebSocket, ...]
 
 
 class ConnectionManager:
     def __init__(self):
+        # Connections are kept in tuples: connect and disconnect store a new
+        # one, so a send iterates the snapshot it read even if sockets come and
+        # go while it awaits. Registry updates never await, so they need no lock.
+        # Users hold a handful of sockets, so a tuple beats hashing into a set.
         # Store active connections by user_id
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
-        # Store session connections (user_id, session_id) -> Set[WebSocket]
-        self.session_connections: Dict[tuple, Set[WebSocket]] = {}
+        self.active_connections: Dict[int, Connections] = {}
+        # Store session connections (user_id, session_id) -> Connections
+        self.session_connections: Dict[tuple, Connections] = {}
+        # Connections that asked for binary frames instead of text
+        self.binary_connections: Set[WebSocket] = set()
+        # Reverse index: connection -> (user_id, session_id) it was registered as
+        self._ws_index: Dict[WebSocket, Tuple[int, Optional[int]]] = {}
+        # Latest fire-and-forget send per connection; later sends wait for it
+        # so frames still reach each socket in the order they were sent
+        self._pending_sends: Dict[WebSocket, asyncio.Task] = {}
+        # Redis bus: messages waiting to be published, in order, and the tasks
+        # that publish them and deliver received ones to the local sockets
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._publisher: Optional[asyncio.Task] = None
+        self._subscriber: Optional[asyncio.Task] = None
 
-    async def connect(self, websocket: WebSocket, user_id: int, session_id: int = None):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        session_id: int = None,
+        binary: bool = False,
+    ):
         """Accept a WebSocket connection."""
         await websocket.accept()
+        if settings.websocket_redis_bus and (
+            self._subscriber is None or self._subscriber.done()
+        ):
+            self._subscriber = asyncio.create_task(self._subscribe_loop())
+        if binary:
+            self.binary_connections.add(websocket)
+        self._ws_index[websocket] = (user_id, session_id)
 
         # Add to user connections
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = set()
-        self.active_connections[user_id].add(websocket)
+        self._add(self.active_connections, user_id, websocket)
 
         # Add to session connections if session_id provided
         if session_id:
-            key = (user_id, session_id)
-            if key not in self.session_connections:
-                self.session_connections[key] = set()
-            self.session_connections[key].add(websocket)
+            self._add(self.session_connections, (user_id, session_id), websocket)
+
+    async def disconnect(self, websocket: WebSocket):
+        """Remove a WebSocket connection; unknown or removed ones are ignored."""
+        keys = self._ws_index.pop(websocket, None)
+        if keys is None:
+            return
+        user_id, session_id = keys
+        self.binary_connections.discard(websocket)
 
-    async def disconnect(
-        self, websocket: WebSocket, user_id: int, session_id: int = None
-    ):
-        """Remove a WebSocket connection."""
         # Remove from user connections
-        if user_id in self.active_connections:
-            self.active_connections[user_id].discard(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
+        self._remove(self.active_connections, user_id, websocket)
 
         # Remove from session connections
         if session_id:
-            key = (user_id, session_id)
-            if key in self.session_connections:
-                self.session_connections[key].discard(websocket)
-                if not self.session_connections[key]:
-                    del self.session_connections[key]
+            self._remove(self.session_connections, (user_id, session_id), websocket)
+
+    async def _full_disconnect(self, websocket: WebSocket):
+        """Drop a failed socket from every registry it is in, then close it.
+
+        A failed send otherwise leaves the socket in its session list, where
+        later broadcasts keep retrying it and it is never released.
+        """
+        await self.disconnect(websocket)
+        try:
+            await websocket.close()
+        except Exception:
+            # Already closed by the client or the server
+            pass
+
+    @staticmethod
+    def _add(mapping: Dict[Hashable, Connections], key, websocket: WebSocket):
+        """Store a copy of the key's connections with the socket appended."""
+        connections = mapping.get(key, ())
+        if websocket not in connections:
+            mapping[key] = (*connections, websocket)
+
+    @staticmethod
+    def _remove(mapping: Dict[Hashable, Connections], key, websocket: WebSocket):
+        """Store a copy of the key's connections without the socket."""
+        connections = mapping.get(key)
+        if not connections or websocket not in connections:
+            return
+        remaining = tuple(ws for ws in connections if ws is not websocket)
+        if remaining:
+            mapping[key] = remaining
+        else:
+            del mapping[key]
+
+    async def _write(
+        self, websocket: WebSocket, message: bytes, text: Optional[str] = None
+    ):
+        """Send encoded JSON as a binary or text frame, per the connection.
+
+        Broadcasts pass the decoded text once for all of their text sockets.
+        """
+        if websocket in self.binary_connections:
+            await websocket.send_bytes(message)
+        else:
+            await websocket.send_text(message.decode() if text is None else text)
+
+    async def _send(
+        self, websocket: WebSocket, message: bytes, text: Optional[str] = None
+    ):
+        """Send after any fire-and-forget sends still queued for the socket."""
+        pending = self._pending_sends.get(websocket)
+        if pending is not None:
+            await asyncio.wait([pending])
+        await self._write(websocket, message, text)
+
+    def broadcast_nowait(
+        self, message: bytes, user_id: int, session_id: Optional[int] = None
+    ):
+        """Schedule a best-effort message without waiting for delivery.
+
+        Goes to the connections of the (user, session) pair, or of the user when
+        no session is given. Failed sockets are dropped like in awaited sends.
+        """
+        if settings.websocket_redis_bus:
+            self._publish_nowait(_channel(user_id, session_id), message)
+        else:
+            self._schedule_local(message, user_id, session_id)
+
+    def _schedule_local(
+        self, message: bytes, user_id: int, session_id: Optional[int] = None
+    ):
+        """Schedule ordered sends to the matching sockets of this process."""
+        if session_id:
+            connections = self.session_connections.get((user_id, session_id))
+            target, target_id = "session", session_id
+        else:
+            connections = self.active_connections.get(user_id)
+            target, target_id = "user", user_id
+
+        if not connections:
+            return
+        text = message.decode()
+        for websocket in connections:
+            task = asyncio.create_task(
+                self._safe_send(
+                    websocket,
+                    message,
+                    text,
+                    self._pending_sends.get(websocket),
+                    target,
+                    target_id,
+                )
+            )
+            self._pending_sends[websocket] = task
+            task.add_done_callback(
+                lambda done, websocket=websocket: self._forget_send(websocket, done)
+            )
+
+    async def _safe_send(
+        self,
+        websocket: WebSocket,
+        message: bytes,
+        text: str,
+        previous: Optional[asyncio.Task],
+        target: str,
+        target_id: int,
+    ):
+        """Send one scheduled message in order, dropping the socket on failure."""
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self._write(websocket, message, text)
+        except Exception as e:
+            log.warning("Error sending message to %s %s: %s", target, target_id, e)
+            await self._full_disconnect(websocket)
+
+    def _forget_send(self, websocket: WebSocket, task: asyncio.Task):
+        """Drop a finished send unless a newer one was queued behind it."""
+        if self._pending_sends.get(websocket) is task:
+            del self._pending_sends[websocket]
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, message: bytes, websocket: WebSocket):
         """Send a message to a specific WebSocket."""
         try:
-            await websocket.send_text(message)
+            await self._send(websocket, message)
         except Exception as e:
-            print(f"Error sending message to WebSocket: {e}")
+            log.warning("Error sending message to WebSocket: %s", e)
+
+    async def _fan_out(
+        self,
+        connections: Optional[Connections],
+        message: bytes,
+        target: str,
+        target_id: int,
+    ):
+        """Send a message to every connection given, dropping failed ones."""
+        if not connections:
+            return
+        if len(connections) == 1:
+            # The common single-socket case skips gather's task machinery
+            websocket = connections[0]
+            try:
+                await self._send(websocket, message)
+            except Exception as e:
+                log.warning("Error sending message to %s %s: %s", target, target_id, e)
+                await self._full_disconnect(websocket)
+            return
+
+        # Disconnects replace the tuple rather than mutating it, so it is safe
+        # to iterate while sends are pending
+        text = message.decode()
+        results = await asyncio.gather(
+            *(self._send(websocket, message, text) for websocket in connections),
+            return_exceptions=True,
+        )
 
-    async def send_message_to_user(self, message: str, user_id: int):
+        # Remove disconnected websockets
+        for websocket, result in zip(connections, results):
+            if isinstance(result, Exception):
+                log.warning(
+                    "Error sending message to %s %s: %s", target, target_id, result
+                )
+                await self._full_disconnect(websocket)
+
+    async def send_message_to_user(self, message: bytes, user_id: int):
         """Send a message to all connections of a specific user."""
-        if user_id in self.active_connections:
-            disconnected = set()
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(message)
-                except Exception as e:
-                    print(f"Error sending message to user {user_id}: {e}")
-                    disconnected.add(websocket)
-
-            # Remove disconnected websockets
-            for ws in disconnected:
-                self.active_connections[user_id].discard(ws)
+        if settings.websocket_redis_bus:
+            self._publish_nowait(_channel(user_id), message)
+            return
+        await self._fan_out(
+            self.active_connections.get(user_id), message, "user", user_id
+        )
 
     async def send_message_to_session(
-        self, message: str, user_id: int, session_id: int
+        self, message: bytes, user_id: int, session_id: int
     ):
         """Send a message to all connections of a specific session."""
-        key = (user_id, session_id)
-        if key in self.session_connections:
-            disconnected = set()
-            for websocket in self.session_connections[key]:
-                try:
-                    await websocket.send_text(message)
-                except Exception as e:
-                    print(f"Error sending message to session {session_id}: {e}")
-                    disconnected.add(websocket)
-
-            # Remove disconnected websockets
-            for ws in disconnected:
-                self.session_connections[key].discard(ws)
-
-    async def broadcast_to_user_sessions(self, message: str, user_id: int):
+        if settings.websocket_redis_bus:
+            self._publish_nowait(_channel(user_id, session_id), message)
+            return
+        await self._fan_out(
+            self.session_connections.get((user_id, session_id)),
+            message,
+            "session",
+            session_id,
+        )
+
+    async def send_json_to_session(self, obj: Any, user_id: int, session_id: int):
+        """Encode an object once and send it to all connections of a session."""
+        await self.send_message_to_session(_encode(obj), user_id, session_id)
+
+    async def broadcast_to_user_sessions(self, message: bytes, user_id: int):
         """Broadcast a message to all sessions of a user."""
         await self.send_message_to_user(message, user_id)
 
+    def _publish_nowait(self, channel: str, message: bytes):
+        """Queue a message for the bus; a single publisher keeps them in order."""
+        self._outbox.put_nowait((channel, message))
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish_loop())
+
+    async def _publish_loop(self):
+        """Publish queued messages, pipelining whatever queued up meanwhile."""
+        while True:
+            batch = [await self._outbox.get()]
+            while not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            try:
+                await redis_manager.batch_exec(("publish", item) for item in batch)
+            except Exception as e:
+                log.warning("Dropped %d WebSocket bus messages: %s", len(batch), e)
+
+    async def _subscribe_loop(self):
+        """Deliver bus messages to the sockets connected to this process."""
+        while True:
+            try:
+                async with redis_manager.redis_client.pubsub(
+                    ignore_subscribe_messages=True
+                ) as pubsub:
+                    await pubsub.psubscribe(BUS_PREFIX + "*")
+                    async for message in pubsub.listen():
+                        # Channels are ws:user:{id} or ws:session:{id}:{id}
+                        _, _, user_id, *session_id = message["channel"].split(":")
+                        self._schedule_local(
+                            message["data"].encode(),
+                            int(user_id),
+                            int(session_id[0]) if session_id else None,
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("WebSocket bus subscription failed, retrying: %s", e)
+                await asyncio.sleep(1)
+
+    async def close(self):
+        """Stop the bus tasks; called once at application shutdown."""
+        for task in (self._publisher, self._subscriber):
+            if task is not None:
+                task.cancel()
+        self._publisher = self._subscriber = None
+
+    def coalesce_chunks(
+        self,
+        encode: Callable[[str], bytes],
+        user_id: int,
+        session_id: int,
+        max_wait_ms: Optional[int] = None,
+    ) -> "ChunkCoalescer":
+        """Start merging one stream's text chunks into fewer session frames."""
+        return ChunkCoalescer(self, encode, user_id, session_id, max_wait_ms)
+
     def get_user_connection_count(self, user_id: int) -> int:
         """Get the number of active connections for a user."""
-        return len(self.active_connections.get(user_id, set()))
+        return len(self.active_connections.get(user_id, ()))
 
     def get_session_connection_count(self, user_id: int, session_id: int) -> int:
         """Get the number of active connections for a session."""
         key = (user_id, session_id)
-        return len(self.session_connections.get(key, set()))
+        return len(self.session_connections.get(key, ()))
+
+
+class ChunkCoalescer:
+    """Buffer the text chunks of one stream and broadcast them in batches.
+
+    Chunks wait up to max_wait_ms after the first buffered one, or until
+    websocket_chunk_max_chars have built up, and then go out as one frame
+    built by encode. A max_wait_ms of 0 sends every chunk as it comes.
+    """
+
+    def __init__(
+        self,
+        manager: ConnectionManager,
+        encode: Callable[[str], bytes],
+        user_id: int,
+        session_id: int,
+        max_wait_ms: Optional[int] = None,
+    ):
+        self.manager = manager
+        self.encode = encode
+        self.user_id = user_id
+        self.session_id = session_id
+        if max_wait_ms is None:
+            max_wait_ms = settings.websocket_chunk_wait_ms
+        self.max_wait = max_wait_ms / 1000
+        self._parts: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, chunk: str):
+        """Buffer a chunk, sending the batch once it is due."""
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if self.max_wait <= 0 or self._size >= settings.websocket_chunk_max_chars:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self.flush
+            )
+
+    def flush(self):
+        """Broadcast whatever is buffered now; call it once the stream ends."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._parts:
+            return
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self.manager.broadcast_nowait(self.encode(text), self.user_id, self.session_id)
+
+
+def _channel(user_id: int, session_id: Optional[int] = None) -> str:
+    """Bus channel of a user's connections, or of one of their sessions."""
+    if session_id:
+        return f"{BUS_PREFIX}session:{user_id}:{session_id}"
+    return f"{BUS_PREFIX}user:{user_id}"
 
 
 manager = ConnectionManager()
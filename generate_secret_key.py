@@ -10,11 +10,29 @@ import base64
 from datetime import datetime
 
 
+ALPHABET = (string.ascii_letters + string.digits + "!@#$%^&*()-_=+").encode()
+
+
+def _map_to_alphabet(data, length):
+    """Pick length alphabet characters from random bytes, drawing more if needed"""
+    # Keep the 7-bit values that index the alphabet (rejection sampling keeps
+    # the choice uniform)
+    key = bytearray()
+    while len(key) < length:
+        for byte in data:
+            value = byte & 0x7F
+            if value < len(ALPHABET):
+                key.append(ALPHABET[value])
+                if len(key) == length:
+                    break
+        else:
+            data = secrets.token_bytes((length - len(key)) * 2)
+    return key.decode()
+
+
 def generate_secret_key(length=64):
     """Generate a secure random secret key"""
-    alphabet = string.ascii_letters + string.digits + "!@#$%^&*()-_=+"
-    secret_key = "".join(secrets.choice(alphabet) for _ in range(length))
-    return secret_key
+    return _map_to_alphabet(secrets.token_bytes(length * 2), length)
 
 
 def generate_base64_key(length=32):
@@ -28,10 +46,11 @@ def main():
     print("=" * 50)
     print()
 
-    # Generate different types of keys
-    standard_key = generate_secret_key(64)
-    base64_key = generate_base64_key(32)
-    simple_key = generate_secret_key(32)
+    # Generate different types of keys from slices of one random draw
+    pool = secrets.token_bytes(224)
+    standard_key = _map_to_alphabet(pool[:128], 64)
+    base64_key = base64.b64encode(pool[128:160]).decode("utf-8")
+    simple_key = _map_to_alphabet(pool[160:], 32)
 
     print("📋 Generated Secret Keys:")
     print()
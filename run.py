@@ -24,6 +24,8 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=reload,
+        loop="uvloop",
+        http="httptools",
         log_level=log_level,
         access_log=True,
     )
@@ -1,40 +1,85 @@
+import os
+
+# bcrypt's minimum cost keeps register and login fast; set before the app
+# loads its settings
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 import pytest
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core.database import get_db, Base
 import tempfile
-import os
 
-# Create an in-memory SQLite database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# Create an in-memory SQLite database for testing; StaticPool hands every
+# session the same connection, so they all see the one database
+SQLALCHEMY_DATABASE_URL = "sqlite://"
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+# One Session object per thread, reused by every request that thread serves
+TestingSessionLocal = scoped_session(
+    sessionmaker(autocommit=False, autoflush=False, bind=engine)
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base.metadata.create_all(bind=engine)
 
 
 def override_get_db():
     """Override database dependency for testing."""
+    db = TestingSessionLocal()
     try:
-        db = TestingSessionLocal()
         yield db
     finally:
+        # Reset the thread's session for its next request; close() releases
+        # the connection and identity map but keeps the Session object
         db.close()
 
 
 app.dependency_overrides[get_db] = override_get_db
 
 
-@pytest.fixture
+def clear_tables(keep=()):
+    """Delete every row, children first, except in the tables named in keep."""
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            if table.name not in keep:
+                connection.execute(table.delete())
+
+
+@pytest.fixture(scope="session")
 def client():
-    """Create a test client."""
+    """Create a test client shared by the whole test session."""
     return TestClient(app)
 
 
+TEST_USER = {
+    "email": "chattest@example.com",
+    "username": "chatuser",
+    "password": "testpassword123",
+}
+
+
+@pytest.fixture(scope="module")
+def auth_token(client: TestClient):
+    """Register and log in TEST_USER once per module; clears all tables after."""
+    client.post("/api/v1/auth/register", json=TEST_USER)
+    login_response = client.post(
+        "/api/v1/auth/login",
+        json={"email": TEST_USER["email"], "password": TEST_USER["password"]},
+    )
+    access_token = login_response.json()["access_token"]
+    yield {
+        "access_token": access_token,
+        "headers": {"Authorization": f"Bearer {access_token}"},
+    }
+    clear_tables()
+
+
 @pytest.fixture
 def db_session():
     """Create a database session for testing."""
@@ -42,13 +87,20 @@ def db_session():
     try:
         yield session
     finally:
-        session.close()
+        TestingSessionLocal.remove()
 
 
 @pytest.fixture
 def cleanup_db():
     """Clean up database after each test."""
     yield
-    # Clean up after test
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    # Clean up after test by emptying the tables; the schema itself is created
+    # once at import
+    clear_tables()
+
+
+@pytest.fixture
+def cleanup_chat_db():
+    """Clean up chat data after each test, keeping registered users."""
+    yield
+    clear_tables(keep=("users",))
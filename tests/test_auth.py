@@ -1,6 +1,19 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
+from app.api.dependencies import (
+    USER_CACHE_TOMBSTONE,
+    _refresh_state_cache,
+    _user_cache_key,
+    invalidate_cached_user,
+    load_user,
+)
+from app.core.redis import redis_manager
+from app.core.security import create_refresh_token, verify_token
+from app.models.user import User
 from app.schemas.user import UserCreate
+from app.services import user_service as user_service_module
+from app.services.user_service import USER_BLOOM_READY_KEY, UserService
 
 
 def test_root_endpoint(client: TestClient):
@@ -121,3 +134,180 @@ def test_unauthorized_access(client: TestClient):
     """Test access without authentication."""
     response = client.get("/api/v1/users/me")
     assert response.status_code == 403
+
+
+def register_and_login(client: TestClient, email: str, username: str):
+    """Register a user and return their login tokens."""
+    password = "testpassword123"
+    client.post(
+        "/api/v1/auth/register",
+        json={"email": email, "username": username, "password": password},
+    )
+    response = client.post(
+        "/api/v1/auth/login", json={"email": email, "password": password}
+    )
+    return response.json()
+
+
+def refresh(client: TestClient, refresh_token: str):
+    """Exchange a refresh token for new tokens."""
+    return client.post("/api/v1/auth/refresh", params={"refresh_token": refresh_token})
+
+
+def test_refresh_token_revoked_on_deactivation(client: TestClient, cleanup_db):
+    """Deactivating an account revokes its outstanding refresh tokens."""
+    _refresh_state_cache.clear()
+    tokens = register_and_login(client, "refresh@example.com", "refreshuser")
+
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    assert "access_token" in response.json()
+
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    response = client.delete("/api/v1/users/me", headers=headers)
+    assert response.status_code == 204
+
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 401
+
+
+def test_refresh_token_without_version_claim(
+    client: TestClient, db_session, cleanup_db
+):
+    """Refresh tokens issued before versioning count as version 0."""
+    _refresh_state_cache.clear()
+    register_and_login(client, "legacy@example.com", "legacyuser")
+    user = db_session.query(User).filter(User.email == "legacy@example.com").one()
+    legacy_token = create_refresh_token(data={"user_id": user.id, "email": user.email})
+    assert "v" not in verify_token(legacy_token)
+
+    assert user.token_version == 0
+    assert refresh(client, legacy_token).status_code == 200
+
+    # Once the version moves on, the unversioned token no longer matches
+    user.token_version = 1
+    db_session.commit()
+    asyncio.run(invalidate_cached_user(user.id))
+    assert refresh(client, legacy_token).status_code == 401
+
+
+def test_invalidate_cached_user_evicts_refresh_state(client: TestClient, cleanup_db):
+    """Invalidating a user drops their cached refresh state."""
+    _refresh_state_cache.clear()
+    tokens = register_and_login(client, "evict@example.com", "evictuser")
+    assert refresh(client, tokens["refresh_token"]).status_code == 200
+    user_id = verify_token(tokens["refresh_token"])["user_id"]
+    assert user_id in _refresh_state_cache
+
+    asyncio.run(invalidate_cached_user(user_id))
+    assert user_id not in _refresh_state_cache
+
+
+class FakeRedis:
+    """In-memory stand-in for the Redis client that logs every write."""
+
+    def __init__(self):
+        self.store = {}
+        self.log = []
+        # When set, non-tombstone SETs signal set_waiting and then wait for
+        # hold_sets before writing
+        self.hold_sets = None
+        self.set_waiting = None
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if self.hold_sets is not None and value != USER_CACHE_TOMBSTONE:
+            self.set_waiting.set()
+            await self.hold_sets.wait()
+        if nx and key in self.store:
+            return None
+        self.log.append(("SET", key))
+        self.store[key] = value
+        return True
+
+    async def delete(self, key):
+        self.log.append(("DEL", key))
+        return int(self.store.pop(key, None) is not None)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Route redis_manager's client to a FakeRedis for the test."""
+    fake = FakeRedis()
+    monkeypatch.setattr(redis_manager, "redis_client", fake)
+    return fake
+
+
+def test_deactivation_after_cache_fill_is_not_undone(
+    db_session, cleanup_db, fake_redis
+):
+    """A cache fill lands before a later deactivation's invalidation."""
+    user = User(email="fill@example.com", username="filluser", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    user_service = UserService(db_session)
+
+    async def fill_then_deactivate():
+        assert (await load_user(user_service, user.id)).is_active
+        user_service.deactivate_user(user.id)
+        await invalidate_cached_user(user.id)
+        # Give any queued write its chance to land
+        await asyncio.sleep(0.1)
+
+    asyncio.run(fill_then_deactivate())
+    key = _user_cache_key(user.id)
+    assert fake_redis.log == [("SET", key), ("SET", key)]
+    assert fake_redis.store[key] == USER_CACHE_TOMBSTONE
+
+
+def test_cache_fill_racing_deactivation_keeps_tombstone(
+    db_session, cleanup_db, fake_redis
+):
+    """A fill read before a deactivation cannot overwrite its invalidation."""
+    user = User(email="race@example.com", username="raceuser", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    user_service = UserService(db_session)
+
+    async def deactivate_during_fill():
+        fake_redis.hold_sets = asyncio.Event()
+        fake_redis.set_waiting = asyncio.Event()
+        # The fill reads the still-active user, then stalls before its SET
+        fill = asyncio.create_task(load_user(user_service, user.id))
+        await fake_redis.set_waiting.wait()
+        user_service.deactivate_user(user.id)
+        await invalidate_cached_user(user.id)
+        fake_redis.hold_sets.set()
+        await fill
+        return await load_user(user_service, user.id)
+
+    assert not asyncio.run(deactivate_during_fill()).is_active
+    assert fake_redis.store[_user_cache_key(user.id)] == USER_CACHE_TOMBSTONE
+
+
+def test_failed_bloom_insert_schedules_reseed(monkeypatch):
+    """A failed bloom insert distrusts the filters and schedules a reseed."""
+    calls = []
+
+    async def failing_batch_exec(commands):
+        raise ConnectionError("Redis unavailable")
+
+    async def delete(key):
+        calls.append(("delete", key))
+
+    async def reseed():
+        calls.append("reseed")
+
+    monkeypatch.setattr(redis_manager, "batch_exec", failing_batch_exec)
+    monkeypatch.setattr(redis_manager, "delete", delete)
+    monkeypatch.setattr(user_service_module, "seed_user_bloom", reseed)
+    monkeypatch.setattr(user_service_module, "_bloom_reseed_task", None)
+
+    async def add_then_yield():
+        await UserService(None).add_to_bloom("bloom@example.com", "bloomuser")
+        await asyncio.sleep(0)
+
+    asyncio.run(add_then_yield())
+    assert calls == [("delete", USER_BLOOM_READY_KEY), "reseed"]
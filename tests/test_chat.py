@@ -1,30 +1,58 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event, func
+from sqlalchemy.exc import InvalidRequestError
+
+from app.models.chat_message import ChatMessage, MessageRole
+from app.models.chat_participant import ChatParticipant, ParticipantRole
+from app.models.chat_session import ChatSession, SessionType
+from app.models.user import User
+from app.schemas.chat import ChatMessageCreate, ChatSessionCreate, InviteUserRequest
+from app.services.chat_service import ChatService
+
+
+def create_users(db_session, *names):
+    """Add one user per name and return their ids."""
+    users = [
+        User(email=f"{name}@example.com", username=name, hashed_password="x")
+        for name in names
+    ]
+    db_session.add_all(users)
+    db_session.commit()
+    return [user.id for user in users]
+
+
+def bulk_create_sessions(client: TestClient, headers, titles):
+    """Create one session per title with a single request."""
+    return client.post(
+        "/api/v1/chat/sessions/bulk",
+        json={"sessions": [{"title": title} for title in titles]},
+        headers=headers,
+    )
+
+
+def bulk_add_messages(client: TestClient, headers, session_id, messages):
+    """Add messages to a session, in order, with a single request."""
+    return client.post(
+        f"/api/v1/chat/sessions/{session_id}/messages/bulk",
+        json={"messages": messages},
+        headers=headers,
+    )
 
 
 class TestChatEndpoints:
     """Test chat-related endpoints."""
 
     @pytest.fixture(autouse=True)
-    def setup(self, client: TestClient, cleanup_db):
-        """Set up test user and authentication."""
-        self.client = client
-
-        # Register user
-        user_data = {
-            "email": "chattest@example.com",
-            "username": "chatuser",
-            "password": "testpassword123",
-        }
-        self.client.post("/api/v1/auth/register", json=user_data)
+    def setup(self, client: TestClient, auth_token, cleanup_chat_db):
+        """Use the session's client and the module's logged-in test user.
 
-        # Login and get token
-        login_response = self.client.post(
-            "/api/v1/auth/login",
-            json={"email": "chattest@example.com", "password": "testpassword123"},
-        )
-        self.token = login_response.json()["access_token"]
-        self.headers = {"Authorization": f"Bearer {self.token}"}
+        Both fixtures are shared, so this only binds them; each test's sessions
+        and messages are removed afterwards, keeping the user.
+        """
+        self.client = client
+        self.token = auth_token["access_token"]
+        self.headers = auth_token["headers"]
 
     def test_create_chat_session(self):
         """Test creating a new chat session."""
@@ -43,11 +71,10 @@ class TestChatEndpoints:
     def test_get_chat_sessions(self):
         """Test getting user's chat sessions."""
         # Create a few sessions
-        for i in range(3):
-            session_data = {"title": f"Test Session {i+1}"}
-            self.client.post(
-                "/api/v1/chat/sessions", json=session_data, headers=self.headers
-            )
+        create_response = bulk_create_sessions(
+            self.client, self.headers, [f"Test Session {i+1}" for i in range(3)]
+        )
+        assert create_response.status_code == 201
 
         response = self.client.get("/api/v1/chat/sessions", headers=self.headers)
         assert response.status_code == 200
@@ -153,12 +180,10 @@ class TestChatEndpoints:
             {"role": "user", "content": "Second message"},
         ]
 
-        for message in messages:
-            self.client.post(
-                f"/api/v1/chat/sessions/{session_id}/messages",
-                json=message,
-                headers=self.headers,
-            )
+        add_response = bulk_add_messages(
+            self.client, self.headers, session_id, messages
+        )
+        assert add_response.status_code == 201
 
         # Get messages
         response = self.client.get(
@@ -169,6 +194,69 @@ class TestChatEndpoints:
         assert len(data) == 3
         assert data[0]["content"] == messages[0]["content"]
 
+    def test_session_messages_cursor_pages(self):
+        """Walking message pages by cursor returns every message exactly once."""
+        session_id = bulk_create_sessions(
+            self.client, self.headers, ["Cursor Session"]
+        ).json()[0]["id"]
+        contents = [f"m{i}" for i in range(7)]
+        bulk_add_messages(
+            self.client,
+            self.headers,
+            session_id,
+            [{"role": "user", "content": content} for content in contents],
+        )
+
+        seen = []
+        params = {"limit": 3}
+        while True:
+            response = self.client.get(
+                f"/api/v1/chat/sessions/{session_id}/messages",
+                params=params,
+                headers=self.headers,
+            )
+            assert response.status_code == 200
+            # Pages walk backwards in time and are oldest first within a page
+            seen = [message["content"] for message in response.json()] + seen
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            assert len(seen) <= len(contents)
+            params = {"limit": 3, "cursor": cursor}
+
+        assert seen == contents
+
+    def test_chat_sessions_cursor_pages(self):
+        """Walking session pages by cursor returns every session exactly once."""
+        titles = [f"Cursor Session {i}" for i in range(5)]
+        bulk_create_sessions(self.client, self.headers, titles)
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = self.client.get(
+                "/api/v1/chat/sessions", params=params, headers=self.headers
+            )
+            assert response.status_code == 200
+            seen += [session["title"] for session in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+            assert len(seen) <= len(titles)
+            params = {"limit": 2, "cursor": cursor}
+            cursor_used = cursor
+
+        assert len(seen) == len(set(seen))
+        assert sorted(seen) == titles
+
+        # An offset on top of a seek would silently drop rows
+        response = self.client.get(
+            "/api/v1/chat/sessions",
+            params={"skip": 1, "cursor": cursor_used},
+            headers=self.headers,
+        )
+        assert response.status_code == 400
+
     def test_unauthorized_access_to_chat(self):
         """Test unauthorized access to chat endpoints."""
         response = self.client.get("/api/v1/chat/sessions")
@@ -176,3 +264,224 @@ class TestChatEndpoints:
 
         response = self.client.post("/api/v1/chat/sessions", json={"title": "Test"})
         assert response.status_code == 403
+
+
+class TestChatServiceLoading:
+    """Test that chat read paths load only what they declare."""
+
+    def test_session_messages_raise_on_lazy_load(self, db_session, cleanup_db):
+        """Message pages load authors eagerly and refuse other lazy loads."""
+        user = User(email="loader@example.com", username="loader", hashed_password="x")
+        db_session.add(user)
+        db_session.commit()
+
+        chat_service = ChatService(db_session)
+        session_id = chat_service.create_session(
+            user.id, ChatSessionCreate(title="Loading Test Session")
+        ).id
+        chat_service.add_message(
+            session_id,
+            user.id,
+            ChatMessageCreate(role=MessageRole.USER, content="Hello"),
+        )
+        user_id = user.id
+        db_session.expunge_all()
+
+        messages = chat_service.get_session_messages(session_id, user_id)
+        assert [message.user.username for message in messages] == ["loader"]
+        with pytest.raises(InvalidRequestError):
+            messages[0].session
+
+    def test_bulk_writes_reload_rows_in_one_query(self, db_session, cleanup_db):
+        """Bulk creates reload committed rows with one SELECT, not one per row."""
+        (user_id,) = create_users(db_session, "bulkload")
+        chat_service = ChatService(db_session)
+        selects = []
+
+        def count_selects(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        engine = db_session.get_bind()
+        event.listen(engine, "before_cursor_execute", count_selects)
+        try:
+            sessions = chat_service.create_sessions(
+                user_id, [ChatSessionCreate(title=f"Bulk {i}") for i in range(5)]
+            )
+            assert len(selects) == 1
+            assert all(s.id and s.created_at and s.updated_at for s in sessions)
+            assert len(selects) == 1
+
+            selects.clear()
+            messages = chat_service.add_messages(
+                sessions[0].id,
+                user_id,
+                [
+                    ChatMessageCreate(role=MessageRole.USER, content=str(i))
+                    for i in range(5)
+                ],
+            )
+            assert len(selects) == 1
+            assert all(m.id and m.created_at for m in messages)
+            assert len(selects) == 1
+        finally:
+            event.remove(engine, "before_cursor_execute", count_selects)
+
+
+class TestChatServiceCounters:
+    """Test that the denormalized session counters track every change."""
+
+    def assert_counts(self, db_session, session_id, participants, messages):
+        """Check the counter columns against expected and live counts."""
+        db_session.expire_all()
+        session = db_session.get(ChatSession, session_id)
+        live_participants = (
+            db_session.query(func.count(ChatParticipant.id))
+            .filter(
+                ChatParticipant.session_id == session_id,
+                ChatParticipant.is_active == True,
+            )
+            .scalar()
+        )
+        live_messages = (
+            db_session.query(func.count(ChatMessage.id))
+            .filter(ChatMessage.session_id == session_id)
+            .scalar()
+        )
+        assert session.participant_count == live_participants == participants
+        assert session.message_count == live_messages == messages
+
+    def test_counters_through_membership_and_messages(self, db_session, cleanup_db):
+        """Counters follow join, leave, rejoin, invite, remove and messages."""
+        owner_id, member_id, guest_id = create_users(
+            db_session, "owner", "member", "guest"
+        )
+        chat_service = ChatService(db_session)
+        session_id = chat_service.create_session(
+            owner_id,
+            ChatSessionCreate(title="Counters", session_type=SessionType.PUBLIC),
+        ).id
+        self.assert_counts(db_session, session_id, participants=1, messages=0)
+
+        assert chat_service.join_session(session_id, member_id)
+        self.assert_counts(db_session, session_id, participants=2, messages=0)
+
+        # Joining again while active must not count twice
+        assert chat_service.join_session(session_id, member_id)
+        self.assert_counts(db_session, session_id, participants=2, messages=0)
+
+        assert chat_service.leave_session(session_id, member_id)
+        self.assert_counts(db_session, session_id, participants=1, messages=0)
+        # Leaving again is refused and changes nothing
+        assert not chat_service.leave_session(session_id, member_id)
+        self.assert_counts(db_session, session_id, participants=1, messages=0)
+
+        assert chat_service.join_session(session_id, member_id)
+        self.assert_counts(db_session, session_id, participants=2, messages=0)
+
+        assert chat_service.invite_user(
+            session_id, owner_id, InviteUserRequest(user_id=guest_id)
+        )
+        self.assert_counts(db_session, session_id, participants=3, messages=0)
+
+        assert chat_service.remove_participant(session_id, owner_id, guest_id)
+        self.assert_counts(db_session, session_id, participants=2, messages=0)
+        assert not chat_service.remove_participant(session_id, owner_id, guest_id)
+        self.assert_counts(db_session, session_id, participants=2, messages=0)
+
+        message = ChatMessageCreate(role=MessageRole.USER, content="Hello")
+        assert chat_service.add_message(session_id, member_id, message)
+        self.assert_counts(db_session, session_id, participants=2, messages=1)
+
+        # Removed participants can't post, and a refused post isn't counted
+        assert chat_service.add_message(session_id, guest_id, message) is None
+        self.assert_counts(db_session, session_id, participants=2, messages=1)
+
+        chat_service.add_messages(session_id, owner_id, [message, message, message])
+        self.assert_counts(db_session, session_id, participants=2, messages=4)
+
+
+class TestChatServiceUpsert:
+    """Test the participant insert-or-reactivate upsert."""
+
+    def setup_session(self, db_session):
+        """Create a public session with an owner and two other users."""
+        owner_id, member_id, guest_id = create_users(
+            db_session, "owner", "member", "guest"
+        )
+        chat_service = ChatService(db_session)
+        session_id = chat_service.create_session(
+            owner_id,
+            ChatSessionCreate(title="Upsert", session_type=SessionType.PUBLIC),
+        ).id
+        return chat_service, session_id, owner_id, member_id, guest_id
+
+    def participant_count(self, db_session, session_id):
+        """Read the session's participant counter from the database."""
+        db_session.expire_all()
+        return db_session.get(ChatSession, session_id).participant_count
+
+    def test_insert_new_participant(self, db_session, cleanup_db):
+        """A first invite inserts a row with the invited role and counts it."""
+        chat_service, session_id, owner_id, _, guest_id = self.setup_session(db_session)
+
+        participant = chat_service.invite_user(
+            session_id,
+            owner_id,
+            InviteUserRequest(user_id=guest_id, role=ParticipantRole.ADMIN),
+        )
+        assert participant.is_active
+        assert participant.role == ParticipantRole.ADMIN
+        assert self.participant_count(db_session, session_id) == 2
+
+    def test_upsert_of_active_participant_is_a_no_op(self, db_session, cleanup_db):
+        """Upserting an active row, as a concurrent join would, changes nothing."""
+        chat_service, session_id, _, member_id, _ = self.setup_session(db_session)
+        joined = chat_service.join_session(session_id, member_id)
+
+        participant = chat_service._activate_participant(
+            session_id, member_id, ParticipantRole.VIEWER, set_role=True
+        )
+        assert participant.id == joined.id
+        assert participant.is_active
+        assert participant.role == ParticipantRole.MEMBER
+        assert self.participant_count(db_session, session_id) == 2
+        assert db_session.query(ChatParticipant).count() == 2
+
+    def test_rejoin_reactivates_row_with_previous_role(self, db_session, cleanup_db):
+        """Joining after leaving reuses the row and keeps its role."""
+        chat_service, session_id, owner_id, member_id, _ = self.setup_session(
+            db_session
+        )
+        invited = chat_service.invite_user(
+            session_id,
+            owner_id,
+            InviteUserRequest(user_id=member_id, role=ParticipantRole.ADMIN),
+        )
+        invited_id = invited.id
+        chat_service.leave_session(session_id, member_id)
+        assert self.participant_count(db_session, session_id) == 1
+
+        participant = chat_service.join_session(session_id, member_id)
+        assert participant.id == invited_id
+        assert participant.is_active
+        assert participant.role == ParticipantRole.ADMIN
+        assert self.participant_count(db_session, session_id) == 2
+
+    def test_invite_reactivates_row_with_invited_role(self, db_session, cleanup_db):
+        """Inviting a former participant reactivates them with the new role."""
+        chat_service, session_id, owner_id, member_id, _ = self.setup_session(
+            db_session
+        )
+        joined_id = chat_service.join_session(session_id, member_id).id
+        chat_service.leave_session(session_id, member_id)
+
+        participant = chat_service.invite_user(
+            session_id,
+            owner_id,
+            InviteUserRequest(user_id=member_id, role=ParticipantRole.VIEWER),
+        )
+        assert participant.id == joined_id
+        assert participant.is_active
+        assert participant.role == ParticipantRole.VIEWER
+        assert self.participant_count(db_session, session_id) == 2
@@ -0,0 +1,25 @@
+import asyncio
+
+from app.core.redis import RedisManager
+
+
+def test_disconnect_flushes_batch_held_by_flusher():
+    """Writes the flusher already dequeued are sent when disconnect cancels it."""
+    sent = []
+
+    async def run():
+        manager = RedisManager()
+
+        async def batch_exec(commands):
+            sent.extend(args[0] for _, args, _ in commands)
+
+        manager.batch_exec = batch_exec
+        manager.set_async_fire_and_forget("first", "1", 60)
+        # Let the flusher take the write off the queue and start its sleep
+        await asyncio.sleep(0)
+        assert manager._pending.empty()
+        manager.set_async_fire_and_forget("second", "2", 60)
+        await manager.disconnect()
+
+    asyncio.run(run())
+    assert sent == ["first", "second"]